@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from random import Random
+
+from check_my_grade import CsvStorage, Student, StudentManagement, Professor, ProfessorManagement, Course, CourseManagement, Grade, GradeManagement, TranscriptEngine, User, UserManagement
+
+course_ids = ["Data200", "Data201", "Data202", "Data230"]
+grade_rows = [("1", "A", "100 to 90"), ("2", "A-", "91 to 80"), ("3", "B+", "81 to 71"), ("4", "B", "70 to 61"), ("5", "B-", "60 to 51"), ("6", "C", "50 to 41")]
+
+
+def generate_dataset(directory, size, seed=0):
+    """Writes synthetic csvs with size students, size // 100 professors and a login per person."""
+    random = Random(seed)
+    password = hashlib.sha256("password".encode("utf-8")).hexdigest()
+    with open(os.path.join(directory, "student.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["first_name", "last_name", "email_address", "courses", "grades", "marks"])
+        for i in range(size):
+            courses = random.sample(course_ids, random.randint(1, 3))
+            marks = [random.randint(40, 100) for _ in courses]
+            grades = [random.choice(grade_rows)[1] for _ in courses]
+            writer.writerow([f"First{i}", f"Last{i}", f"student{i}@school.com", ",".join(courses), ",".join(grades), ",".join(map(str, marks))])
+    with open(os.path.join(directory, "professor.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "email_address", "rank", "courses"])
+        for i in range(max(size // 100, 1)):
+            writer.writerow([f"Professor{i}", f"professor{i}@school.com", "Professor", ",".join(random.sample(course_ids, 2))])
+    with open(os.path.join(directory, "login.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["user_id", "password", "role"])
+        for i in range(size):
+            writer.writerow([f"student{i}@school.com", password, "student"])
+        for i in range(max(size // 100, 1)):
+            writer.writerow([f"professor{i}@school.com", password, "professor"])
+    with open(os.path.join(directory, "course.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["course_id", "credits", "course_name", "course_desc"])
+        for course_id in course_ids:
+            writer.writerow([course_id, 3, f"Course {course_id}", f"Description of {course_id}"])
+    with open(os.path.join(directory, "grades.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["grade_id", "grade", "marks_range"])
+        writer.writerows(grade_rows)
+
+
+def measure(name, size, operation, count):
+    """Times count calls of operation and one more call under tracemalloc for peak memory."""
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        call_start = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+    tracemalloc.start()
+    operation(count)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies.sort()
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    result = {
+        "operation": name,
+        "size": size,
+        "count": count,
+        "throughput_ops_s": count / total if total else 0,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentiles[49] * 1000,
+        "p90_ms": percentiles[89] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "peak_memory_bytes": peak,
+    }
+    print(f"{size:>9} {name:<28} {result['throughput_ops_s']:>12.1f} ops/s  p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms", file=sys.stderr)
+    return result
+
+
+def run_size(size, ops):
+    """Runs every benchmark against a fresh synthetic dataset of size students."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        generate_dataset(directory, size)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            loads = max(min(ops, 5), 1)
+            results.append(measure("students.load", size, lambda i: StudentManagement(), loads))
+            snapshot_writer = StudentManagement(storage=CsvStorage(snapshots=True))
+            snapshot_writer.save_students(snapshot_writer.student_dict.values())
+            results.append(measure("students.load_snapshot", size, lambda i: StudentManagement(storage=CsvStorage(snapshots=True)), loads))
+            # Cascades go to managers on this dataset, not to the shared ones
+            users = UserManagement()
+            student_management = StudentManagement(users=users)
+            results.append(measure("students.save", size, lambda i: student_management.save_students(student_management.student_dict.values()), loads))
+            results.append(measure("students.add", size, lambda i: student_management.add_new_student(Student("Bench", "Student", f"bench{i}@school.com", "Data200", "A", "95")), ops))
+            results.append(measure("students.update", size, lambda i: student_management.update_student(student_management.get_student(f"bench{i}@school.com")), ops))
+            results.append(measure("students.assign_course", size, lambda i: student_management.assign_course(student_management.get_student(f"bench{i}@school.com"), "Data201"), ops))
+            results.append(measure("students.add_grade", size, lambda i: student_management.add_grade(student_management.get_student(f"bench{i}@school.com"), "Data201", "B", "75"), ops))
+            results.append(measure("students.delete", size, lambda i: student_management.delete_student(f"bench{i}@school.com"), ops))
+            results.append(measure("students.get_student", size, lambda i: student_management.get_student(f"student{i % size}@school.com"), ops * 10))
+            results.append(measure("students.get_students", size, lambda i: student_management.get_students(f"Last{i % size}"), ops))
+            results.append(measure("students.query_students", size, lambda i: student_management.query_students(f"course:{course_ids[i % len(course_ids)]} marks>=95 grade:A"), ops))
+            results.append(measure("students.course_students", size, lambda i: student_management.course_students(course_ids[i % len(course_ids)]), ops))
+            results.append(measure("students.course_stats", size, lambda i: student_management.course_stats(course_ids[i % len(course_ids)]), ops))
+            results.append(measure("students.course_mark_stats", size, lambda i: student_management.course_mark_stats(student_management.course_students(course_ids[i % len(course_ids)])[1]), ops))
+            results.append(measure("students.top_students", size, lambda i: student_management.top_students(course_ids[i % len(course_ids)], 10), ops))
+            results.append(measure("students.student_rank", size, lambda i: student_management.student_rank("Data200", f"student{i % size}@school.com"), ops * 10))
+            results.append(measure("students.sort_by_email", size, lambda i: sorted(student_management.students, key=lambda s: s.email_address), loads))
+            results.append(measure("students.sort_by_marks", size, lambda i: sorted(student_management.students, key=lambda s: sum(map(int, s.marks_list())) if s.marks else 0), loads))
+
+            transcript_engine = TranscriptEngine(student_management, CourseManagement(students=student_management, professors=ProfessorManagement(users=users)), GradeManagement())
+            results.append(measure("transcripts.deans_list", size, lambda i: transcript_engine.deans_list(), loads))
+            results.append(measure("transcripts.class_rank", size, lambda i: transcript_engine.class_rank(f"student{i % size}@school.com"), ops * 10))
+
+            results.append(measure("professors.load", size, lambda i: ProfessorManagement(), loads))
+            professor_management = ProfessorManagement(users=users)
+            results.append(measure("professors.add", size, lambda i: professor_management.add_new_professor(Professor("Bench", f"bench{i}@school.com", "Professor")), ops))
+            results.append(measure("professors.update", size, lambda i: professor_management.update_professor(professor_management.get_professor(f"bench{i}@school.com")), ops))
+            results.append(measure("professors.delete", size, lambda i: professor_management.delete_professor(f"bench{i}@school.com"), ops))
+
+            results.append(measure("users.load", size, lambda i: UserManagement(), loads))
+            user_management = UserManagement()
+            results.append(measure("users.login", size, lambda i: user_management.login(f"student{i % size}@school.com", "password", "student"), ops * 10))
+            results.append(measure("users.add", size, lambda i: user_management.add_user(User(f"bench{i}@school.com", "hash", "student")), ops))
+            results.append(measure("users.delete", size, lambda i: user_management.delete_user(f"bench{i}@school.com"), ops))
+
+            results.append(measure("courses.load", size, lambda i: CourseManagement(students=student_management, professors=professor_management), loads))
+            course_management = CourseManagement(students=student_management, professors=professor_management)
+            results.append(measure("courses.add", size, lambda i: course_management.add_new_course(Course(f"Bench{i}", 3, "Bench", "Bench course")), ops))
+            results.append(measure("courses.delete", size, lambda i: course_management.delete_course(f"Bench{i}"), ops))
+
+            results.append(measure("grades.load", size, lambda i: GradeManagement(), loads))
+            grade_management = GradeManagement()
+            results.append(measure("grades.add", size, lambda i: grade_management.add_grade(Grade(f"bench{i}", "Z", "0 to 0")), ops))
+            results.append(measure("grades.delete", size, lambda i: grade_management.delete_grade(f"bench{i}"), ops))
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def run(sizes, ops):
+    """Runs the suite for every dataset size and returns the report."""
+    results = []
+    # Keep the managers' status prints out of a JSON report written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for size in sizes:
+            results.extend(run_size(size, ops))
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ops": ops,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """Returns (operation, size, baseline p50, current p50, change) for results slower by more than threshold."""
+    baseline_results = {(result["operation"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_results.get((result["operation"], result["size"]))
+        if not previous or not previous["p50_ms"]:
+            continue
+        change = (result["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"]
+        if change > threshold:
+            regressions.append((result["operation"], result["size"], previous["p50_ms"], result["p50_ms"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every Management operation on synthetic datasets.")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated student counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--ops", type=int, default=20, help="calls per mutation and query benchmark")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two JSON reports instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as file:
+            baseline = json.load(file)
+        with open(args.compare[1]) as file:
+            current = json.load(file)
+        regressions = compare(baseline, current, args.threshold)
+        for operation, size, before, after, change in regressions:
+            print(f"REGRESSION {operation} at {size}: p50 {before:.3f} ms -> {after:.3f} ms (+{change:.0%})")
+        if not regressions:
+            print("No regressions")
+        return 1 if regressions else 0
+
+    report = run([int(size) for size in args.sizes.split(",")], args.ops)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,1039 @@
+import argparse
+import asyncio
+import atexit
+import bisect
+import contextlib
 import csv
+import functools
+import gc
+import json
 import os
 import hashlib
+import inspect
+import io
+import marshal
+import mmap
+import re
+import sqlite3
 import statistics
+import struct
+import sys
+import tempfile
+import threading
 import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 users_csv = "login.csv"
 students_csv = "student.csv"
 professors_csv = "professor.csv"
 courses_csv = "course.csv"
 grades_csv = "grades.csv"
+students_journal = "student.csv.journal"
+students_offset_index = "student.csv.idx"
+journal_compact_threshold = 1000
+query_intersect_ratio = 8
+display_page_size = 50
+grade_points = {"A+": 4.0, "A": 4.0, "A-": 3.7, "B+": 3.3, "B": 3.0, "B-": 2.7, "C+": 2.3, "C": 2.0, "C-": 1.7, "D+": 1.3, "D": 1.0, "D-": 0.7, "F": 0.0}
+sqlite_db = "check_my_grade.db"
+storage_backend = os.environ.get("CHECK_MY_GRADE_STORAGE", "csv")
+write_behind_durability = os.environ.get("CHECK_MY_GRADE_WRITE_BEHIND", "")
+csv_snapshots = os.environ.get("CHECK_MY_GRADE_SNAPSHOTS", "") not in ("", "0")
+metrics_enabled = os.environ.get("CHECK_MY_GRADE_METRICS", "") not in ("", "0")
+metrics_file = os.environ.get("CHECK_MY_GRADE_METRICS_FILE", "")
+
+table_keys = {
+    "users": "user_id",
+    "students": "email_address",
+    "professors": "email_address",
+    "courses": "course_id",
+    "grades": "grade_id",
+}
+table_fields = {
+    "users": ["user_id", "password", "role"],
+    "students": ["first_name", "last_name", "email_address", "courses", "grades", "marks"],
+    "professors": ["name", "email_address", "rank", "courses"],
+    "courses": ["course_id", "credits", "course_name", "course_desc"],
+    "grades": ["grade_id", "grade", "marks_range"],
+}
+
+
+class Metrics:
+    """Call counts, latencies and file bytes of the instrumented Management methods."""
+
+    def __init__(self, enabled=False, max_samples=10000):
+        """Initialize empty metrics, latency percentiles use the last max_samples calls"""
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears every recorded value."""
+        self.calls = {}
+        self.bytes_read = {}
+        self.bytes_written = {}
+
+    def record_call(self, name, seconds):
+        """Records one call of a method."""
+        with self.lock:
+            if name not in self.calls:
+                self.calls[name] = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.max_samples)}
+            call = self.calls[name]
+            call["count"] += 1
+            call["total"] += seconds
+            call["samples"].append(seconds)
+
+    def record_bytes(self, direction, table, size):
+        """Records bytes read or written for a table."""
+        counters = self.bytes_read if direction == "read" else self.bytes_written
+        with self.lock:
+            counters[table] = counters.get(table, 0) + size
+
+    def snapshot(self):
+        """Returns the recorded metrics as a dict."""
+        with self.lock:
+            methods = {}
+            for name, call in sorted(self.calls.items()):
+                samples = sorted(call["samples"])
+                methods[name] = {
+                    "count": call["count"],
+                    "total_ms": call["total"] * 1000,
+                    "p50_ms": samples[int(0.5 * (len(samples) - 1))] * 1000,
+                    "p90_ms": samples[int(0.9 * (len(samples) - 1))] * 1000,
+                    "p99_ms": samples[int(0.99 * (len(samples) - 1))] * 1000,
+                }
+            return {"methods": methods, "bytes_read": dict(self.bytes_read), "bytes_written": dict(self.bytes_written)}
+
+    def to_json(self):
+        """Returns the snapshot as JSON."""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Returns the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = ["# TYPE check_my_grade_calls_total counter"]
+        for name, method in snapshot["methods"].items():
+            lines.append(f'check_my_grade_calls_total{{method="{name}"}} {method["count"]}')
+        lines.append("# TYPE check_my_grade_latency_seconds summary")
+        for name, method in snapshot["methods"].items():
+            for quantile in ("0.5", "0.9", "0.99"):
+                key = {"0.5": "p50_ms", "0.9": "p90_ms", "0.99": "p99_ms"}[quantile]
+                lines.append(f'check_my_grade_latency_seconds{{method="{name}",quantile="{quantile}"}} {method[key] / 1000}')
+            lines.append(f'check_my_grade_latency_seconds_sum{{method="{name}"}} {method["total_ms"] / 1000}')
+            lines.append(f'check_my_grade_latency_seconds_count{{method="{name}"}} {method["count"]}')
+        for direction in ("read", "written"):
+            lines.append(f"# TYPE check_my_grade_bytes_{direction}_total counter")
+            for table, size in snapshot[f"bytes_{direction}"].items():
+                lines.append(f'check_my_grade_bytes_{direction}_total{{table="{table}"}} {size}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None):
+        """Writes the snapshot to path, Prometheus format for .prom files, JSON otherwise, or prints JSON."""
+        if not path:
+            print(self.to_json())
+            return
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus() if path.endswith(".prom") else self.to_json())
+
+
+metrics = Metrics(enabled=metrics_enabled)
+
+
+class ReadWriteLock:
+    """Reentrant lock for many readers or one writer, waiting writers go first.
+
+    Inside sharing() the writer lets readers in while other writers keep
+    waiting, for work that only reads the data, like writing it to disk.
+    """
+
+    def __init__(self):
+        """Initialize an unlocked lock"""
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.writer_depth = 0
+        self.writers_waiting = 0
+        self.shared = False
+        self.local = threading.local()
+
+    def acquire_read(self):
+        """Takes a read lock, nested reads and reads by the writer pass straight through."""
+        depth = getattr(self.local, "depth", 0)
+        self.local.depth = depth + 1
+        if depth or self.writer == threading.get_ident():
+            return
+        with self.condition:
+            while (self.writer is not None or self.writers_waiting) and not self.shared:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        """Releases a read lock."""
+        self.local.depth -= 1
+        if self.local.depth or self.writer == threading.get_ident():
+            return
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        """Takes the write lock, nested writes by the writer pass straight through."""
+        if self.writer == threading.get_ident():
+            self.writer_depth += 1
+            return
+        if getattr(self.local, "depth", 0):
+            raise RuntimeError("cannot upgrade a read lock to a write lock")
+        with self.condition:
+            self.writers_waiting += 1
+            while self.writer is not None or self.readers:
+                self.condition.wait()
+            self.writers_waiting -= 1
+            self.writer = threading.get_ident()
+            self.writer_depth = 1
+
+    def release_write(self):
+        """Releases the write lock."""
+        self.writer_depth -= 1
+        if self.writer_depth:
+            return
+        with self.condition:
+            self.writer = None
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def sharing(self):
+        """Admits readers while the writer holding the lock only reads, then waits for them to leave."""
+        if self.writer != threading.get_ident():
+            yield
+            return
+        with self.condition:
+            self.shared = True
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.shared = False
+                while self.readers:
+                    self.condition.wait()
+
+
+write_method_prefixes = ("add_", "update_", "delete_", "assign_", "save_", "reload_", "change_", "compact_",
+                         "write_", "replay_", "clear_", "reset_", "index_", "unindex_", "import_", "rename_")
+
+
+def synchronized(cls):
+    """Class decorator taking the instance's rw_lock around every public method.
+
+    Methods named like mutations take the write lock, all others a read lock.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, locked(method, name.startswith(write_method_prefixes)))
+    return cls
+
+
+def locked(method, write):
+    """Wraps a method in its instance's read or write lock."""
+    if write:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            self.rw_lock.acquire_write()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.rw_lock.release_write()
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            self.rw_lock.acquire_read()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.rw_lock.release_read()
+    return wrapper
+
+
+def instrumented(cls):
+    """Class decorator timing every public method of a Management class."""
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, timed(method, f"{cls.__name__}.{name}"))
+    return cls
+
+
+def timed(method, name):
+    """Wraps a method so its calls are recorded when metrics are enabled."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not metrics.enabled:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.record_call(name, time.perf_counter() - start)
+    return wrapper
+
+
+def file_signature(path):
+    """Returns the (inode, size, mtime) generation of a file, None when missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+@contextlib.contextmanager
+def file_locked(lock_path, exclusive):
+    """Holds a cross-process advisory fcntl lock on lock_path."""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Pauses the cyclic garbage collector, which would otherwise rescan
+    every object built so far while a large table is loaded."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_csv_rows(path, fields):
+    """Reads a csv as tuples in fields order, columns are matched by header."""
+    try:
+        file = open(path, newline='', encoding='utf-8')
+    except FileNotFoundError:
+        return []
+    with file:
+        reader = csv.reader(file)
+        header = next(reader, fields)
+        if header == fields:
+            return [tuple(row) for row in reader if row]
+        columns = [header.index(field) for field in fields]
+        return [tuple(row[column] for column in columns) for row in reader if row]
+
+
+class CsvStorage:
+    """Stores each table as a csv file that is rewritten on every save.
+
+    Saves write a temp file and rename it over the csv while holding an
+    exclusive fcntl lock on <csv>.lock, loads hold a shared one, so readers
+    never see half a file. If another process replaced the csv since this
+    storage last read or wrote it, a save carrying changed/removed hints is
+    merged into the newer file instead of overwriting it. Hints apply the
+    removed keys before the changed rows, so a key in both moves to the end.
+
+    With snapshots a manager may store the parsed state of a table in
+    <csv>.snap after it saved, zlib-compressed marshal data behind a header
+    holding the format version, a crc32 of the payload and the csv
+    generation it was written from. load_snapshot returns it while that
+    generation is still the csv on disk. Plain loads never write snapshots.
+
+    reshard() splits the students table over files keyed by a hash of the
+    email: <csv>.manifest holds the shard count and a student lives in
+    shard crc32(email_address) % shards. The manifest is checked on every
+    load, save and stale check, so storages opened before a reshard move
+    to the shards instead of recreating the csv. Saves with changed/removed
+    hints rewrite only the shards they touch, merged with each shard as it
+    is on disk. Shard rows carry a sequence column and the manifest the
+    next free sequence: rows keep theirs when changed in place, added or
+    moved rows take new ones, and loads merge the shards in sequence order
+    so the roster order survives resharding. Sharded tables are not snapshotted.
+    """
+    sharded_tables = ("students",)
+    sequence_field = "sequence"
+    snapshot_magic = b"CMGS"
+    snapshot_format = 2
+    snapshot_header = struct.Struct("<4sHQqqI")
+
+    def __init__(self, fsync=False, snapshots=False):
+        """Initialize storage, fsync makes every save durable before the rename"""
+        self.fsync = fsync
+        self.snapshots = snapshots
+        self.signatures = {}
+
+    def path(self, table):
+        """Returns the csv file of a table."""
+        return {
+            "users": users_csv,
+            "students": students_csv,
+            "professors": professors_csv,
+            "courses": courses_csv,
+            "grades": grades_csv,
+        }[table]
+
+    def signature(self, table):
+        """Returns the (inode, size, mtime) generation of a csv, None when missing.
+
+        For a sharded table it is the shard count and the generations of every shard file.
+        """
+        shards = self.shard_count(table)
+        if not shards:
+            return file_signature(self.path(table))
+        return (shards,) + tuple(file_signature(self.shard_path(table, shard, shards)) for shard in range(shards))
+
+    def manifest_path(self, table):
+        """Returns the manifest file of a sharded table."""
+        return self.path(table) + ".manifest"
+
+    def shard_count(self, table):
+        """Returns the number of shards of a table, 0 when it is a single csv."""
+        manifest = self.read_manifest(table)
+        return manifest["shards"] if manifest else 0
+
+    def read_manifest(self, table):
+        """Returns the manifest of a sharded table, None when it is a single csv."""
+        if table not in self.sharded_tables:
+            return None
+        try:
+            with open(self.manifest_path(table), encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def write_manifest(self, table, shards, sequence):
+        """Atomically replaces the manifest of a table."""
+        manifest_path = self.manifest_path(table)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(manifest_path)), prefix=os.path.basename(manifest_path), suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump({"shards": shards, "sequence": sequence}, file)
+        os.replace(temp_path, manifest_path)
+
+    def shard_path(self, table, shard, shards):
+        """Returns the csv file of one shard, e.g. student.002-of-008.csv."""
+        base, extension = os.path.splitext(self.path(table))
+        return f"{base}.{shard:03}-of-{shards:03}{extension}"
+
+    def shard_of(self, key, shards):
+        """Returns the shard of a row key."""
+        return zlib.crc32(key.encode('utf-8')) % shards
+
+    def locked(self, table, exclusive):
+        """Holds the cross-process advisory lock of a table."""
+        return file_locked(self.path(table) + ".lock", exclusive)
+
+    def is_stale(self, table):
+        """Returns True when the csv changed since this storage last read or wrote it."""
+        return self.signature(table) != self.signatures.get(table)
+
+    def load(self, table):
+        """Loads the rows of a table as dicts."""
+        with self.locked(table, exclusive=False):
+            return self.read(table)
+
+    def read(self, table):
+        """Reads a csv and remembers its generation."""
+        if self.shard_count(table):
+            fields = table_fields[table]
+            return [dict(zip(fields, row)) for row in self.read_rows(table)]
+        self.signatures[table] = self.signature(table)
+        if self.signatures[table] is None:
+            return []
+        with open(self.path(table), newline='', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        if metrics.enabled:
+            metrics.record_bytes("read", table, self.signatures[table][1])
+        return rows
+
+    def load_rows(self, table):
+        """Loads the rows of a table as tuples in table_fields order."""
+        with self.locked(table, exclusive=False):
+            return self.read_rows(table)
+
+    def read_rows(self, table):
+        """Reads a csv, or every shard, as tuples in table_fields order and remembers its generation."""
+        shards = self.shard_count(table)
+        if shards:
+            return self.read_shards(table, shards)
+        self.signatures[table] = self.signature(table)
+        if self.signatures[table] is None:
+            return []
+        rows = read_csv_rows(self.path(table), table_fields[table])
+        if metrics.enabled:
+            metrics.record_bytes("read", table, self.signatures[table][1])
+        return rows
+
+    def read_shards(self, table, shards):
+        """Reads the shards of a table, merged in sequence order."""
+        self.signatures[table] = self.signature(table)
+        fields = table_fields[table] + [self.sequence_field]
+        size = sum(signature[1] for signature in self.signatures[table][1:] if signature)
+        rows = [row for shard in range(shards) for row in read_csv_rows(self.shard_path(table, shard, shards), fields)]
+        rows.sort(key=lambda row: int(row[-1]))
+        rows = [row[:-1] for row in rows]
+        if metrics.enabled:
+            metrics.record_bytes("read", table, size)
+        return rows
+
+    def snapshot_path(self, table):
+        """Returns the binary snapshot file of a table."""
+        return self.path(table) + ".snap"
+
+    def load_snapshot(self, table):
+        """Loads the snapshot state of a table, None when snapshots are off or it is not current."""
+        if not self.snapshots or self.shard_count(table):
+            return None
+        with self.locked(table, exclusive=False):
+            return self.read_snapshot(table)
+
+    def read_snapshot(self, table):
+        """Returns the snapshot state when it matches the csv on disk, None otherwise."""
+        signature = self.signature(table)
+        try:
+            with open(self.snapshot_path(table), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        if signature is None or len(data) < self.snapshot_header.size:
+            return None
+        magic, version, inode, size, mtime_ns, crc = self.snapshot_header.unpack_from(data)
+        if magic != self.snapshot_magic or version != self.snapshot_format or (inode, size, mtime_ns) != signature:
+            return None
+        payload = memoryview(data)[self.snapshot_header.size:]
+        if zlib.crc32(payload) != crc:
+            return None
+        state = marshal.loads(zlib.decompress(payload))
+        self.signatures[table] = signature
+        if metrics.enabled:
+            metrics.record_bytes("read", f"{table}_snapshot", len(data))
+        return state
+
+    def write_snapshot(self, table, state):
+        """Writes marshal-able state as the snapshot of the csv generation last read or written.
+
+        Does nothing when snapshots are off, the table is sharded or this
+        storage has not seen the csv as it is now, the caller's state then
+        may not match it.
+        """
+        signature = self.signatures.get(table)
+        if not self.snapshots or self.shard_count(table) or not isinstance(signature, tuple):
+            return
+        inode, size, mtime_ns = signature
+        payload = zlib.compress(marshal.dumps(state), 1)
+        path = self.snapshot_path(table)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(self.snapshot_header.pack(self.snapshot_magic, self.snapshot_format, inode, size, mtime_ns, zlib.crc32(payload)))
+                file.write(payload)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if metrics.enabled:
+            metrics.record_bytes("written", f"{table}_snapshot", self.snapshot_header.size + len(payload))
+
+    def save(self, table, rows, changed=None, removed=None):
+        """Rewrites the whole csv, changed and removed are used to merge external changes."""
+        with self.locked(table, exclusive=True):
+            self.save_locked(table, rows, changed, removed)
+
+    def save_locked(self, table, rows, changed, removed):
+        """Saves a table while its exclusive lock is held."""
+        shards = self.shard_count(table)
+        if shards:
+            return self.save_shards(table, shards, rows, changed, removed)
+        externally_modified = table in self.signatures and self.signature(table) != self.signatures[table]
+        merged = externally_modified and (changed is not None or removed is not None)
+        if merged:
+            rows = self.merge(table, changed, removed)
+        self.write(table, rows)
+        if merged:
+            # The file now holds rows the caller has not seen, keep it stale until reloaded
+            self.signatures[table] = "merged"
+
+    def merge(self, table, changed, removed):
+        """Applies changed and removed rows on top of the csv as it is on disk."""
+        key = table_keys[table]
+        merged = {record[key]: record for record in self.read(table)}
+        for record in removed or ():
+            merged.pop(record, None)
+        for record in changed or ():
+            merged[record[key]] = record
+        return merged.values()
+
+    def save_shards(self, table, shards, rows, changed, removed):
+        """Saves a sharded table, rewriting only the touched shards when hints are given."""
+        key = table_keys[table]
+        if changed is None and removed is None:
+            self.write_shards(table, shards, rows)
+            self.signatures[table] = self.signature(table)
+            return
+        externally_modified = self.signature(table) != self.signatures.get(table)
+        sequence = self.read_manifest(table).get("sequence", 0)
+        touched = {}
+        for record in removed or ():
+            touched.setdefault(self.shard_of(record, shards), ({}, set()))[1].add(record)
+        for record in changed or ():
+            touched.setdefault(self.shard_of(record[key], shards), ({}, set()))[0][record[key]] = {**record, self.sequence_field: sequence}
+            sequence += 1
+        fields = table_fields[table] + [self.sequence_field]
+        key_column = fields.index(key)
+        for shard, (shard_changed, shard_removed) in touched.items():
+            path = self.shard_path(table, shard, shards)
+            records = {row[key_column]: dict(zip(fields, row)) for row in read_csv_rows(path, fields) if row[key_column] not in shard_removed}
+            for record_key, record in shard_changed.items():
+                if record_key in records:
+                    # Changed in place, it keeps its place in the roster
+                    record[self.sequence_field] = records[record_key][self.sequence_field]
+                records[record_key] = record
+            self.write_csv(table, path, records.values(), fields)
+        self.write_manifest(table, shards, sequence)
+        # Shards written by others were merged in, keep the table stale until reloaded
+        self.signatures[table] = "merged" if externally_modified else self.signature(table)
+
+    def write_shards(self, table, shards, rows):
+        """Rewrites every shard of a table from rows in roster order and resets the manifest."""
+        key = table_keys[table]
+        groups = [[] for _ in range(shards)]
+        for sequence, record in enumerate(rows):
+            groups[self.shard_of(record[key], shards)].append({**record, self.sequence_field: sequence})
+        fields = table_fields[table] + [self.sequence_field]
+        for shard, records in enumerate(groups):
+            self.write_csv(table, self.shard_path(table, shard, shards), records, fields)
+        self.write_manifest(table, shards, sum(len(records) for records in groups))
+
+    def reshard(self, table, shards):
+        """Moves a table to shards files and switches the manifest, returns the number of rows.
+
+        Holds the table's exclusive lock, so other processes block on it,
+        then find the manifest and their copy stale and reload from the shards.
+        """
+        if table not in self.sharded_tables or shards < 1:
+            raise ValueError(f"{table} can not be split in {shards} shards")
+        with self.locked(table, exclusive=True):
+            old_shards = self.shard_count(table)
+            fields = table_fields[table]
+            rows = [dict(zip(fields, row)) for row in self.read_rows(table)]
+            if shards == old_shards:
+                return len(rows)
+            old_paths = [self.shard_path(table, shard, old_shards) for shard in range(old_shards)] if old_shards else [self.path(table), self.snapshot_path(table)]
+            self.write_shards(table, shards, rows)
+            for path in old_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.signatures[table] = self.signature(table)
+        return len(rows)
+
+    def write(self, table, rows):
+        """Writes rows to a temp file and atomically renames it over the csv."""
+        self.write_csv(table, self.path(table), rows)
+        self.signatures[table] = self.signature(table)
+
+    def write_csv(self, table, path, rows, fields=None):
+        """Writes dict rows of a table to path through a temp file and an atomic rename."""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path), suffix=".tmp")
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode if os.path.exists(path) else 0o644)
+            with os.fdopen(fd, 'w') as file:
+                writer = csv.DictWriter(file, fieldnames=fields or table_fields[table])
+                writer.writeheader()
+                writer.writerows(rows)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if metrics.enabled:
+            metrics.record_bytes("written", table, os.path.getsize(path))
+
+
+class SqliteStorage:
+    """Stores every table in one sqlite database, indexed by its key.
+
+    Every save bumps the table's row in generations inside its write
+    transaction, so a commit to one table does not make the others stale.
+    """
+
+    def __init__(self, db_path=None):
+        """Opens the database and creates missing tables."""
+        self.db_path = db_path or sqlite_db
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for table, fields in table_fields.items():
+                columns = ", ".join(f"{field} TEXT PRIMARY KEY" if field == table_keys[table] else f"{field} TEXT" for field in fields)
+                self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS enrollments (email_address TEXT, course_id TEXT, grade TEXT, marks INTEGER, PRIMARY KEY (email_address, course_id))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS enrollments_course_id ON enrollments (course_id)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, generation INTEGER)")
+        self.versions = {}
+
+    def generation(self, table):
+        """Returns the number of committed saves of a table."""
+        row = self.connection.execute("SELECT generation FROM generations WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def is_stale(self, table):
+        """Returns True when another connection saved the table since it was loaded."""
+        return self.generation(table) != self.versions.get(table)
+
+    def load(self, table):
+        """Loads the rows of a table as dicts."""
+        fields = table_fields[table]
+        # Read before the rows, a save in between leaves the table stale rather than missed
+        self.versions[table] = self.generation(table)
+        cursor = self.connection.execute(f"SELECT {', '.join(fields)} FROM {table} ORDER BY rowid")
+        return [dict(zip(fields, row)) for row in cursor]
+
+    def load_rows(self, table):
+        """Loads the rows of a table as tuples in table_fields order."""
+        self.versions[table] = self.generation(table)
+        return self.connection.execute(f"SELECT {', '.join(table_fields[table])} FROM {table} ORDER BY rowid").fetchall()
+
+    def get(self, table, key):
+        """Returns one row by key, None when missing."""
+        fields = table_fields[table]
+        row = self.connection.execute(f"SELECT {', '.join(fields)} FROM {table} WHERE {table_keys[table]} = ?", (key,)).fetchone()
+        return dict(zip(fields, row)) if row else None
+
+    def course_enrollments(self, course_id):
+        """Returns (email_address, grade, marks) rows for a course."""
+        return self.connection.execute("SELECT email_address, grade, marks FROM enrollments WHERE course_id = ?", (course_id,)).fetchall()
+
+    def course_students(self, course_id):
+        """Returns (email_address, first_name, last_name, grade, marks) rows for a course in roster order."""
+        return self.connection.execute(
+            "SELECT students.email_address, first_name, last_name, enrollments.grade, enrollments.marks FROM enrollments "
+            "JOIN students ON students.email_address = enrollments.email_address WHERE course_id = ? ORDER BY students.rowid", (course_id,)).fetchall()
+
+    def course_marks(self, course_id):
+        """Returns the integer marks of a course in ascending order."""
+        return [row[0] for row in self.connection.execute(
+            "SELECT marks FROM enrollments WHERE course_id = ? AND typeof(marks) = 'integer' ORDER BY marks", (course_id,))]
+
+    def save(self, table, rows, changed=None, removed=None):
+        """Upserts changed rows and deletes removed keys, or replaces the table when no hints are given."""
+        key = table_keys[table]
+        fields = table_fields[table]
+        upsert = f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))}) " \
+                 f"ON CONFLICT({key}) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in fields if field != key)}"
+        with self.connection:
+            # The first write of the transaction, it holds the write lock from here to the commit
+            generation = self.connection.execute(
+                "INSERT INTO generations (name, generation) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET generation = generation + 1 RETURNING generation", (table,)).fetchone()[0]
+            if changed is None and removed is None:
+                self.connection.execute(f"DELETE FROM {table}")
+                if table == "students":
+                    self.connection.execute("DELETE FROM enrollments")
+                changed = rows
+            for record in removed or ():
+                self.connection.execute(f"DELETE FROM {table} WHERE {key} = ?", (record,))
+                if table == "students":
+                    self.connection.execute("DELETE FROM enrollments WHERE email_address = ?", (record,))
+            for record in changed or ():
+                self.connection.execute(upsert, [record[field] for field in fields])
+                if table == "students":
+                    self.save_enrollments(record)
+        if self.versions.get(table) == generation - 1:
+            # Nobody else saved since the load, memory still mirrors the table
+            self.versions[table] = generation
+
+    def save_enrollments(self, record):
+        """Mirrors a student row's courses into the enrollments table."""
+        self.connection.execute("DELETE FROM enrollments WHERE email_address = ?", (record["email_address"],))
+        student = Student(**record)
+        self.connection.executemany(
+            "INSERT INTO enrollments (email_address, course_id, grade, marks) VALUES (?, ?, ?, ?)",
+            [(student.email_address, course_id, enrollment.grade, enrollment.marks if enrollment.marks_text is None else enrollment.marks_text) for course_id, enrollment in student.enrollments.items() if course_id])
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+
+class WriteBehindStorage:
+    """Applies saves to an in-memory copy of each table and writes them from a background flusher.
+
+    Saves are coalesced per key and written by one inner save per interval
+    seconds or batch_size saves, on flush() and at exit. durability picks
+    what a save guarantees on return:
+      "interval" - nothing, changes reach the inner storage within interval
+      "commit"   - the change was written, concurrent saves share one write
+      "fsync"    - as commit, and the write was fsynced
+    With commit or fsync a save whose flush fails raises the flush error,
+    the change stays queued and is retried by the next flush.
+    """
+    durabilities = ("interval", "commit", "fsync")
+
+    def __init__(self, storage, interval=1.0, batch_size=100, durability="interval"):
+        """Wraps storage and starts the flusher thread"""
+        if durability not in self.durabilities:
+            raise ValueError(f"durability must be one of {self.durabilities}")
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = batch_size
+        self.durability = durability
+        if durability == "fsync":
+            if isinstance(storage, CsvStorage):
+                storage.fsync = True
+            elif isinstance(storage, SqliteStorage):
+                storage.connection.execute("PRAGMA synchronous=FULL")
+        self.tables = {}
+        self.pending = {}
+        self.saved = 0
+        self.flushed = 0
+        self.flush_error = None
+        self.failed = 0
+        self.lock = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        """Passes other storage methods (get, course_enrollments, ...) to the inner storage."""
+        if name == "storage":
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    def is_stale(self, table):
+        """Returns True when the inner storage was changed by someone else."""
+        return self.storage.is_stale(table)
+
+    def load(self, table):
+        """Flushes pending saves of the table and loads it from the inner storage."""
+        self.flush()
+        rows = self.storage.load(table)
+        key = table_keys[table]
+        with self.lock:
+            self.tables[table] = {record[key]: record for record in rows}
+        return rows
+
+    def load_rows(self, table):
+        """Loads the rows of a table as tuples in table_fields order."""
+        fields = table_fields[table]
+        return [tuple(record[field] for field in fields) for record in self.load(table)]
+
+    def save(self, table, rows, changed=None, removed=None):
+        """Records a save in memory and queues it for the flusher."""
+        key = table_keys[table]
+        with self.lock:
+            pending = self.pending.setdefault(table, {"full": False, "changed": {}, "removed": set()})
+            if table not in self.tables or (changed is None and removed is None):
+                self.tables[table] = {record[key]: record for record in rows}
+                pending["full"] = True
+            for record in removed or ():
+                self.tables[table].pop(record, None)
+                pending["changed"].pop(record, None)
+                pending["removed"].add(record)
+            for record in changed or ():
+                self.tables[table][record[key]] = record
+                # Kept in removed too, a key in both is moved to the end by the inner save
+                pending["changed"][record[key]] = record
+            self.saved += 1
+            sequence = self.saved
+            batch_ready = sum(len(p["changed"]) + len(p["removed"]) for p in self.pending.values()) >= self.batch_size
+        if batch_ready or self.durability != "interval":
+            self.wakeup.set()
+        if self.durability != "interval":
+            with self.lock:
+                while self.flushed < sequence and not self.closed:
+                    if self.failed >= sequence:
+                        raise self.flush_error
+                    self.lock.wait()
+
+    def run(self):
+        """Flusher loop."""
+        while not self.closed:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"*******Error, write-behind flush failed: {str(e)}*********")
+
+    def flush(self):
+        """Writes every pending save to the inner storage, one save per table."""
+        with self.flush_lock:
+            with self.lock:
+                batches = {table: (list(self.tables[table].values()), pending) for table, pending in self.pending.items()}
+                self.pending = {}
+                sequence = self.saved
+            try:
+                for table, (rows, pending) in batches.items():
+                    if pending["full"]:
+                        self.storage.save(table, rows)
+                    else:
+                        self.storage.save(table, rows, list(pending["changed"].values()), list(pending["removed"]))
+            except Exception as e:
+                with self.lock:
+                    # Retry the whole table on the next flush, fail the saves waiting for this one
+                    for table in batches:
+                        self.pending.setdefault(table, {"full": False, "changed": {}, "removed": set()})["full"] = True
+                    self.flush_error = e
+                    self.failed = max(self.failed, sequence)
+                    self.lock.notify_all()
+                raise
+            with self.lock:
+                self.flushed = max(self.flushed, sequence)
+                self.lock.notify_all()
+
+    def close(self):
+        """Flushes and stops the flusher thread."""
+        if self.closed:
+            return
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+        self.wakeup.set()
+        atexit.unregister(self.close)
+
+
+def make_storage():
+    """Returns the storage backend selected by storage_backend and write_behind_durability."""
+    if storage_backend == "sqlite":
+        storage = SqliteStorage()
+    else:
+        storage = CsvStorage(snapshots=csv_snapshots)
+    if write_behind_durability:
+        storage = WriteBehindStorage(storage, durability=write_behind_durability)
+    return storage
+
+
+def migrate_csv_to_sqlite(db_path=None):
+    """Imports every csv table into the sqlite database."""
+    csv_storage = CsvStorage()
+    sqlite_storage = SqliteStorage(db_path)
+    for table in table_fields:
+        rows = csv_storage.load(table)
+        sqlite_storage.save(table, rows)
+        print(f"Imported {len(rows)} {table}")
+    sqlite_storage.close()
+
+class PageIndex:
+    """Sorted keys of a table, a page by offset or after a cursor key costs O(log n + page size)."""
+
+    def __init__(self, keys=()):
+        """Initialize the index from table keys"""
+        self.keys = sorted(keys)
+
+    def update(self, changed=(), removed=()):
+        """Adds changed keys and drops removed ones."""
+        for key in removed:
+            index = bisect.bisect_left(self.keys, key)
+            if index < len(self.keys) and self.keys[index] == key:
+                del self.keys[index]
+        for key in changed:
+            index = bisect.bisect_left(self.keys, key)
+            if index == len(self.keys) or self.keys[index] != key:
+                self.keys.insert(index, key)
+
+    def page(self, page_size, offset=0, after=None):
+        """Returns (keys, cursor) of a page, the cursor is None on the last page."""
+        start = bisect.bisect_right(self.keys, after) if after is not None else offset
+        keys = self.keys[start:start + page_size]
+        return keys, keys[-1] if start + page_size < len(self.keys) else None
+
+
+def render_table(title, rows, fields, out=None):
+    """Writes dict rows as one aligned table with a single write."""
+    widths = [max([len(field)] + [len(str(row[field])) for row in rows]) for field in fields]
+    lines = [f"*********{title}**************",
+             "  ".join(field.ljust(width) for field, width in zip(fields, widths)).rstrip(),
+             "  ".join("-" * width for width in widths)]
+    lines.extend("  ".join(str(row[field]).ljust(width) for field, width in zip(fields, widths)).rstrip() for row in rows)
+    lines.append("*******************************\n")
+    (out or sys.stdout).write("\n".join(lines))
+
+
+class LazyManager:
+    """Stands in for a shared manager and builds it on first attribute access."""
+
+    def __init__(self, factory):
+        """Initialize with the manager class or factory"""
+        self.factory = factory
+        self.instance = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        """Forwards attribute access to the manager, loading it first."""
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        """Returns a string representation of the object."""
+        state = "loaded" if self.instance is not None else "not loaded"
+        return f"LazyManager({self.factory}, {state})"
+
+    def load(self):
+        """Returns the manager, building it on first use."""
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    self.instance = self.factory()
+        return self.instance
+
+
+class Enrollment:
+    """Grade and integer marks for one of a student's courses.
+
+    Stored marks that are not a plain integer keep their csv text in
+    marks_text, with marks None, so they are written back unchanged.
+    """
+    __slots__ = ("grade", "marks", "marks_text")
+
+    def __init__(self, grade="", marks=None, marks_text=None):
+        """Initialize enrollment"""
+        self.grade = grade
+        self.marks = marks
+        self.marks_text = marks_text
+
+    def __repr__(self):
+        """Returns a string representation of the object."""
+        return f"Enrollment(grade={self.grade}, marks={self.stored_marks()})"
+
+    def stored_marks(self):
+        """Returns the marks as written to csv."""
+        if self.marks_text is not None:
+            return self.marks_text
+        return "" if self.marks is None else str(self.marks)
+
 
 class Student:
+    __slots__ = ("first_name", "last_name", "email_address", "enrollments")
+
     def __init__(self, first_name, last_name, email_address, courses="", grades="", marks=""):
         """Initialize student"""
         self.first_name = first_name
         self.last_name = last_name
         self.email_address = email_address
-        self.courses = courses
-        self.grades = grades
-        self.marks = marks
+        self.set_enrollments(courses, grades, marks)
 
     def __repr__(self):
         """Returns a string representation of the object."""
@@ -28,9 +1043,56 @@ class Student:
         """Returns a human-readable string representation."""
         return f"Student(first_name={self.first_name}, last_name={self.last_name}, email_address={self.email_address}, courses={self.courses}, grades={self.grades}, marks={self.marks})"
 
+    def set_enrollments(self, courses, grades, marks):
+        """Parses the comma-joined csv columns into enrollments.
+
+        An empty courses column parses to the single course id "", the same
+        as str.split, so rows with marks but no course round-trip unchanged.
+        """
+        course_list = courses.split(",")
+        grade_list = grades.split(",") if grades else []
+        marks_list = marks.split(",") if marks else []
+        self.enrollments = {}
+        for i, course_id in enumerate(course_list):
+            grade = grade_list[i] if i < len(grade_list) else ""
+            text = marks_list[i] if i < len(marks_list) else ""
+            course_marks = parse_marks(text)
+            stored = "" if course_marks is None else str(course_marks)
+            self.enrollments[course_id] = Enrollment(grade, course_marks, None if text == stored else text)
+
+    @property
+    def courses(self):
+        """Comma-joined course ids, as stored in csv."""
+        return ",".join(self.enrollments)
+
+    @courses.setter
+    def courses(self, courses):
+        self.set_enrollments(courses, self.grades, self.marks)
+
+    @property
+    def grades(self):
+        """Comma-joined grades, as stored in csv."""
+        if not any(enrollment.grade for enrollment in self.enrollments.values()):
+            return ""
+        return ",".join(enrollment.grade for enrollment in self.enrollments.values())
+
+    @grades.setter
+    def grades(self, grades):
+        self.set_enrollments(self.courses, grades, self.marks)
+
+    @property
+    def marks(self):
+        """Comma-joined marks, as stored in csv."""
+        marks = [enrollment.stored_marks() for enrollment in self.enrollments.values()]
+        return ",".join(marks) if any(marks) else ""
+
+    @marks.setter
+    def marks(self, marks):
+        self.set_enrollments(self.courses, self.grades, marks)
+
     def course_list(self):
         """Returns a list of courses the student is enrolled in."""
-        return self.courses.split(",")
+        return list(self.enrollments)
 
     def grade_list(self):
         """Returns a list of grades for the student’s courses."""
@@ -42,45 +1104,58 @@ class Student:
 
     def course_dict(self):
         """Returns a dictionary mapping courses to grades and marks."""
-        course_dict = {}
-        grade_list = self.grade_list()
-        marks_list = self.marks_list()
-        course_list = self.course_list()
-        for i in range(len(course_list)):
-            if not self.grades:
-                course_dict[course_list[i]] = {"grade": "", "marks": ""}
-            else:
-                course_dict[course_list[i]] = {"grade": grade_list[i], "marks": marks_list[i]}
-        return course_dict
+        return {course_id: {"grade": enrollment.grade, "marks": enrollment.stored_marks()}
+                for course_id, enrollment in self.enrollments.items()}
 
     def course_dict_to_string(self, course_dict):
         """Updates student grades and marks from a dictionary."""
-        self.grades = ""
-        self.marks = ""
-        for course in self.course_list():
-            self.add_grade(course_dict[course]["grade"])
-            self.add_marks(course_dict[course]["marks"])
+        for course_id in self.enrollments:
+            self.set_result(course_id, course_dict[course_id]["grade"], course_dict[course_id]["marks"])
+
+    def set_result(self, course_id, grade, marks):
+        """Sets grade and marks for an enrolled course.
+
+        New marks must be integers, the stored text of marks that are not
+        is accepted back unchanged, as course_dict() hands it out.
+        """
+        enrollment = self.enrollments[course_id]
+        enrollment.grade = grade
+        if enrollment.marks_text is not None and marks == enrollment.marks_text:
+            return
+        enrollment.marks = int(marks) if marks not in ("", None) else None
+        enrollment.marks_text = None
 
     def add_course(self, course_id):
         """Adds a new course to the student’s list."""
         if not self.courses:
-            self.courses = course_id
+            # Replace the "" placeholder course, keeping any marks stored on it
+            self.enrollments = {course_id: self.enrollments.pop("", Enrollment())}
         else:
-            self.courses = self.courses + "," + course_id
+            self.enrollments[course_id] = Enrollment()
+
+    def remove_course(self, course_id):
+        """Drops a course with its grade and marks."""
+        self.enrollments.pop(course_id, None)
+        if not self.enrollments:
+            self.enrollments = {"": Enrollment()}
+
+    def rename_course(self, course_id, new_course_id):
+        """Renames a course in place, keeping its grade and marks."""
+        self.enrollments = {new_course_id if enrolled == course_id else enrolled: enrollment for enrolled, enrollment in self.enrollments.items()}
 
     def add_grade(self, grade_id):
-        """Adds a grade for a specific course."""
-        if not self.grades:
-            self.grades = grade_id
-        else:
-            self.grades = self.grades + "," + grade_id
+        """Adds a grade for the next course without one."""
+        for enrollment in self.enrollments.values():
+            if not enrollment.grade:
+                enrollment.grade = grade_id
+                return
 
     def add_marks(self, marks):
-        """Adds marks for a specific course."""
-        if not self.marks:
-            self.marks = marks
-        else:
-            self.marks = self.marks + "," + marks
+        """Adds marks for the next course without them."""
+        for enrollment in self.enrollments.values():
+            if enrollment.marks is None and enrollment.marks_text is None:
+                enrollment.marks = int(marks)
+                return
 
     def update_first_name(self, first_name):
         """Updates the student’s first name."""
@@ -92,15 +1167,17 @@ class Student:
 
     def check_my_grades(self):
         """Prints the student’s grades for each course."""
-        course_dict = self.course_dict()
-        for course in course_dict:
-            print(f"Course: {course}, Grade: {course_dict[course]["grade"]}")
+        for course, enrollment in self.enrollments.items():
+            print(f"Course: {course}, Grade: {enrollment.grade}")
 
     def check_my_marks(self):
         """Prints the student’s marks for each course."""
-        course_dict = self.course_dict()
-        for course in course_dict:
-            print(f"Course: {course}, Marks: {course_dict[course]["marks"]}")
+        for course, enrollment in self.enrollments.items():
+            print(f"Course: {course}, Marks: {enrollment.stored_marks()}")
+
+    def search_fields(self):
+        """Returns the fields matched by student search."""
+        return (self.first_name, self.last_name, self.email_address, self.courses, self.grades, self.marks)
 
     def to_dict(self):
         """Converts student details into a dictionary."""
@@ -113,89 +1190,944 @@ class Student:
             "marks": self.marks
         }
 
+    def state(self):
+        """Returns the parsed student as marshal-able tuples, for snapshots."""
+        return (self.first_name, self.last_name, self.email_address,
+                tuple((course_id, enrollment.grade, enrollment.marks, enrollment.marks_text)
+                      for course_id, enrollment in self.enrollments.items()))
+
+    @classmethod
+    def from_state(cls, first_name, last_name, email_address, enrollments):
+        """Builds a student from state() without parsing the csv columns."""
+        student = cls.__new__(cls)
+        student.first_name = first_name
+        student.last_name = last_name
+        student.email_address = email_address
+        student.enrollments = {course_id: Enrollment(grade, marks, marks_text) for course_id, grade, marks, marks_text in enrollments}
+        return student
+
+
+class StudentSearchIndex:
+    """Trigram index over the searchable student fields.
+
+    positions numbers the students in the order they were first added, the
+    roster order, so matches can be returned in it.
+    """
+    gram_size = 3
+
+    def __init__(self, students=()):
+        """Initialize the index from student objs"""
+        self.postings = {}
+        self.student_grams = {}
+        self.positions = {}
+        self.next_position = 0
+        for student in students:
+            self.add(student)
+
+    def grams(self, value):
+        """Returns the set of n-grams of a string."""
+        return {value[i:i + self.gram_size] for i in range(len(value) - self.gram_size + 1)}
+
+    def add(self, student, moved=False):
+        """Indexes a student, replacing any previous entry for the email.
+
+        moved gives an indexed student the last position, as when the roster moved them to the end.
+        """
+        self.remove_grams(student.email_address)
+        if moved or student.email_address not in self.positions:
+            self.positions[student.email_address] = self.next_position
+            self.next_position += 1
+        student_grams = set()
+        for field in student.search_fields():
+            student_grams |= self.grams(field)
+        for gram in student_grams:
+            self.postings.setdefault(gram, set()).add(student.email_address)
+        self.student_grams[student.email_address] = student_grams
+
+    def remove(self, email_address):
+        """Drops a student from the index."""
+        self.remove_grams(email_address)
+        self.positions.pop(email_address, None)
+
+    def remove_grams(self, email_address):
+        """Drops a student's n-grams, keeping their position."""
+        for gram in self.student_grams.pop(email_address, ()):
+            emails = self.postings[gram]
+            emails.discard(email_address)
+            if not emails:
+                del self.postings[gram]
+
+    def candidates(self, search_key):
+        """Returns emails that may contain search_key, None if the key is too short to index."""
+        if len(search_key) < self.gram_size:
+            return None
+        posting_lists = []
+        for gram in self.grams(search_key):
+            if gram not in self.postings:
+                return set()
+            posting_lists.append(self.postings[gram])
+        posting_lists.sort(key=len)
+        return set(posting_lists[0]).intersection(*posting_lists[1:])
+
+
+query_fields = {"first_name": "first_name", "last_name": "last_name", "email": "email_address", "email_address": "email_address",
+                "course": "course", "grade": "grade", "marks": "marks"}
+query_term = re.compile(r"^(\w+)(>=|<=|>|<|=|:)(.*)$")
+key_end = "\U0010ffff"
+
+
+def parse_student_query(text):
+    """Parses a student query into OR groups of AND-ed (field, op, value, term) predicates.
+
+    Terms are separated by spaces: field:value is equality, field:value*
+    a prefix, marks also takes >=, >, <=, < and =, and a bare word is a
+    substring of any field as in get_students. Terms are AND-ed, OR splits
+    groups and binds looser than AND. Fields are first_name, last_name,
+    email, course, grade and marks; grade and marks apply to the group's
+    course when it names one.
+    """
+    groups = [[]]
+    for term in text.split():
+        if term == "OR":
+            groups.append([])
+            continue
+        if term == "AND":
+            continue
+        match = query_term.match(term)
+        if match is None or match.group(1) not in query_fields:
+            groups[-1].append(("any", "contains", term, term))
+            continue
+        field, op, value = query_fields[match.group(1)], match.group(2), match.group(3)
+        if field == "marks":
+            if parse_marks(value) is None:
+                raise ValueError(f"marks must be compared with a number in {term!r}")
+            groups[-1].append((field, "=" if op == ":" else op, parse_marks(value), term))
+        elif op not in (":", "="):
+            raise ValueError(f"{match.group(1)} only supports : in {term!r}")
+        elif value.endswith("*"):
+            groups[-1].append((field, "prefix", value[:-1], term))
+        else:
+            groups[-1].append((field, "=", value, term))
+    groups = [group for group in groups if group]
+    if not groups:
+        raise ValueError("empty query")
+    return groups
+
+
+def match_value(op, actual, value):
+    """Returns True when actual satisfies one predicate operator."""
+    if op == "=":
+        return actual == value
+    if op == "prefix":
+        return actual.startswith(value)
+    if op == "contains":
+        return value in actual
+    if actual is None:
+        return False
+    return {">=": actual >= value, ">": actual > value, "<=": actual <= value, "<": actual < value}[op]
+
+
+def match_student_query(student, group):
+    """Returns True when a student satisfies every predicate of an AND group."""
+    course_predicates = [predicate for predicate in group if predicate[0] == "course"]
+    enrollment_predicates = [predicate for predicate in group if predicate[0] in ("grade", "marks")]
+    for field, op, value, _ in group:
+        if field == "any":
+            if not any(value in text for text in student.search_fields()):
+                return False
+        elif field == "course":
+            if not any(match_value(op, course_id, value) for course_id in student.enrollments if course_id):
+                return False
+        elif field not in ("grade", "marks") and not match_value(op, getattr(student, field), value):
+            return False
+    if not enrollment_predicates:
+        return True
+    for course_id, enrollment in student.enrollments.items():
+        if course_predicates and not any(match_value(op, course_id, value) for _, op, value, _ in course_predicates):
+            continue
+        if all(match_value(op, getattr(enrollment, field), value) for field, op, value, _ in enrollment_predicates):
+            return True
+    return False
+
+
+def parse_marks(marks):
+    """Returns marks as an int, None when blank or not a number."""
+    try:
+        return int(marks)
+    except (TypeError, ValueError):
+        return None
+
+
+class CourseMarkStats:
+    """Running mark statistics for one course."""
 
-class StudentManagement:
     def __init__(self):
-        """Initialize student management"""
-        self.students = self.load_students()
-        self.student_dict = {student.email_address: student for student in self.students}
+        """Initialize empty statistics"""
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0
+        self.sorted_marks = []
+
+    @classmethod
+    def from_sorted(cls, sorted_marks):
+        """Builds statistics from marks already in ascending order."""
+        stats = cls()
+        stats.sorted_marks = list(sorted_marks)
+        stats.count = len(stats.sorted_marks)
+        stats.total = sum(stats.sorted_marks)
+        stats.total_squares = sum(marks * marks for marks in stats.sorted_marks)
+        return stats
 
-    def load_students(self):
-        """Load student objs from csv"""
-        if os.path.exists(students_csv):
-            with open(students_csv, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                students = [Student(**record) for record in reader]
-                return students
-        return []
+    def add(self, marks):
+        """Adds one student's marks."""
+        bisect.insort(self.sorted_marks, marks)
+        self.count += 1
+        self.total += marks
+        self.total_squares += marks * marks
+
+    def remove(self, marks):
+        """Removes one student's marks."""
+        index = bisect.bisect_left(self.sorted_marks, marks)
+        if index < self.count and self.sorted_marks[index] == marks:
+            del self.sorted_marks[index]
+            self.count -= 1
+            self.total -= marks
+            self.total_squares -= marks * marks
+
+    def median(self):
+        """Returns the median of the marks."""
+        middle = self.count // 2
+        if self.count % 2:
+            return self.sorted_marks[middle]
+        return (self.sorted_marks[middle - 1] + self.sorted_marks[middle]) / 2
+
+    def summary(self):
+        """Returns min, max, avg, median, variance and stddev of the marks."""
+        stats = {"min": 0, "max": 0, "avg": 0, "median": 0, "variance": 0, "stddev": 0}
+        if self.count:
+            avg = self.total / self.count
+            variance = max(self.total_squares / self.count - avg * avg, 0)
+            stats["min"] = self.sorted_marks[0]
+            stats["max"] = self.sorted_marks[-1]
+            stats["avg"] = avg
+            stats["median"] = self.median()
+            stats["variance"] = variance
+            stats["stddev"] = variance ** 0.5
+        return stats
 
-    def save_students(self, data):
-        """Saves student objs in csv"""
-        data = [student.to_dict() for student in data]
-        fieldnames = data[0].keys()
-        with open(students_csv, 'w') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in data:
-                writer.writerow(record)
-        self.reload_students()
 
-    def reload_students(self):
-        """Reloads student objs"""
-        self.students = self.load_students()
-        self.student_dict = {student.email_address: student for student in self.students}
+class CourseOrderIndex:
+    """Sorted (key, email) lists of one course's students by grade, email and numeric marks.
 
-    def display_given_students(self, students):
-        """Displays a list of specific students."""
-        print("*********Students**************")
+    Students without numeric marks are kept apart, by email, in the unmarked order.
+    """
+    orders = ("grade", "email", "marks", "unmarked")
+
+    def __init__(self):
+        """Initialize empty orders"""
+        self.entries = {order: [] for order in self.orders}
+
+    def keys(self, email_address, grade, marks):
+        """Returns the sort entry of a student per order, marks only when set, unmarked otherwise."""
+        keys = {"grade": (grade, email_address), "email": (email_address,)}
+        if marks is not None:
+            keys["marks"] = (marks, email_address)
+        else:
+            keys["unmarked"] = (email_address,)
+        return keys
+
+    def add(self, email_address, grade, marks):
+        """Inserts a student into every order."""
+        for order, key in self.keys(email_address, grade, marks).items():
+            bisect.insort(self.entries[order], key)
+
+    def remove(self, email_address, grade, marks):
+        """Removes a student from every order."""
+        for order, key in self.keys(email_address, grade, marks).items():
+            entries = self.entries[order]
+            index = bisect.bisect_left(entries, key)
+            if index < len(entries) and entries[index] == key:
+                del entries[index]
+
+    def span(self, order, low, high):
+        """Returns the emails of an order with keys from low up to, not including, high."""
+        entries = self.entries[order]
+        return [entry[-1] for entry in entries[bisect.bisect_left(entries, low):bisect.bisect_left(entries, high)]]
+
+    def span_size(self, order, low, high):
+        """Returns how many entries span(order, low, high) holds."""
+        entries = self.entries[order]
+        return max(bisect.bisect_left(entries, high) - bisect.bisect_left(entries, low), 0)
+
+    def page(self, order, offset=0, limit=None, descending=False):
+        """Returns the emails at positions offset..offset + limit of an order."""
+        entries = self.entries[order]
+        end = len(entries) if limit is None else min(offset + limit, len(entries))
+        if descending:
+            return [entries[-1 - i][-1] for i in range(offset, end)]
+        return [entries[i][-1] for i in range(offset, end)]
+
+
+class CourseEnrollmentIndex:
+    """Maps course_id to the grade and marks of each enrolled student."""
+
+    def __init__(self, students=()):
+        """Initialize the index from student objs"""
+        self.courses = {}
+        self.stats = {}
+        self.orders = {}
+        self.student_courses = {}
         for student in students:
-            print(student)
-        print("*******************************")
+            self.add(student)
+
+    def add(self, student):
+        """Indexes a student's enrollments, replacing any previous entry for the email."""
+        self.remove(student.email_address)
+        for course_id, enrollment in student.enrollments.items():
+            self.courses.setdefault(course_id, {})[student.email_address] = (enrollment.grade, enrollment.marks)
+            self.orders.setdefault(course_id, CourseOrderIndex()).add(student.email_address, enrollment.grade, enrollment.marks)
+            if enrollment.marks is not None:
+                self.stats.setdefault(course_id, CourseMarkStats()).add(enrollment.marks)
+        self.student_courses[student.email_address] = list(student.enrollments)
+
+    def remove(self, email_address):
+        """Drops a student's enrollments from the index."""
+        for course_id in self.student_courses.pop(email_address, ()):
+            enrollments = self.courses[course_id]
+            grade, marks = enrollments.pop(email_address)
+            self.orders[course_id].remove(email_address, grade, marks)
+            if marks is not None:
+                self.stats[course_id].remove(marks)
+            if not enrollments:
+                del self.courses[course_id]
+                del self.orders[course_id]
+                self.stats.pop(course_id, None)
+
+    def enrollments(self, course_id):
+        """Returns {email: (grade, marks)} for a course, marks as int or None."""
+        return self.courses.get(course_id, {})
+
+    def mark_stats(self, course_id):
+        """Returns the running mark statistics for a course."""
+        return self.stats.get(course_id, CourseMarkStats())
+
+    def order(self, course_id):
+        """Returns the sorted orders of a course."""
+        return self.orders.get(course_id, CourseOrderIndex())
+
+    def rank(self, course_id, email_address):
+        """Returns (rank by marks, highest first, and percentile) of a student, None without marks.
+
+        Equal marks share a rank, the percentile is the share of marks at or below the student's.
+        """
+        _, marks = self.courses.get(course_id, {}).get(email_address, (None, None))
+        if marks is None:
+            return None
+        stats = self.stats[course_id]
+        at_or_below = bisect.bisect_right(stats.sorted_marks, marks)
+        return stats.count - at_or_below + 1, at_or_below / stats.count * 100
+
+
+class CourseMembershipIndex:
+    """Maps course_id to the keys of the rows that list it, and back."""
+
+    def __init__(self, members=()):
+        """Initialize the index from (key, course ids) pairs"""
+        self.courses = {}
+        self.member_courses = {}
+        for key, course_ids in members:
+            self.add(key, course_ids)
+
+    def add(self, key, course_ids):
+        """Indexes a row's courses, replacing any previous entry for the key."""
+        self.remove(key)
+        course_ids = [course_id for course_id in course_ids if course_id]
+        for course_id in course_ids:
+            self.courses.setdefault(course_id, set()).add(key)
+        self.member_courses[key] = course_ids
+
+    def remove(self, key):
+        """Drops a row from the index."""
+        for course_id in self.member_courses.pop(key, ()):
+            members = self.courses[course_id]
+            members.discard(key)
+            if not members:
+                del self.courses[course_id]
+
+    def members(self, course_id):
+        """Returns the keys of the rows listing a course."""
+        return self.courses.get(course_id, set())
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, max_size):
+        """Initialize an empty cache"""
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns a cached value, None when missing."""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        """Caches a value, evicting the oldest entry when full."""
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry."""
+        with self.lock:
+            self.entries.clear()
+
+
+class StudentCsvIndex:
+    """Reads single rows of a memory-mapped student.csv through a persisted email -> byte offset index.
+
+    Readers share one instance under the manager's read lock. A changed csv
+    is mapped and indexed aside and swapped in as one (signature, map,
+    header, offsets, cache) generation, readers keep the one they started
+    with. Rows are located by line, so fields must not contain newlines.
+    """
+
+    def __init__(self, storage, cache_size=1024):
+        """Initialize the index, the csv is mapped on first lookup"""
+        self.storage = storage
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.generation = (None, None, [], {}, LRUCache(cache_size))
+
+    def available(self):
+        """Returns False once student.csv was resharded away."""
+        return not self.storage.shard_count("students")
+
+    def csv_signature(self):
+        """Returns (size, mtime) of student.csv, None when it does not exist."""
+        try:
+            stat = os.stat(students_csv)
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def refresh(self):
+        """Returns the current generation, remapping the csv and its offsets when the file changed."""
+        generation = self.generation
+        if self.csv_signature() == generation[0]:
+            return generation
+        with self.lock:
+            if self.csv_signature() != self.generation[0]:
+                self.generation = self.load_generation()
+            return self.generation
+
+    def load_generation(self):
+        """Maps the csv and reads or rebuilds its offsets, returning them as a new generation."""
+        cache = LRUCache(self.cache_size)
+        try:
+            file = open(students_csv, 'rb')
+        except FileNotFoundError:
+            return (None, None, [], {}, cache)
+        with file:
+            stat = os.fstat(file.fileno())
+            signature = [stat.st_size, stat.st_mtime_ns]
+            if not stat.st_size:
+                return (signature, None, [], {}, cache)
+            csv_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = next(csv.reader([csv_map.readline().decode('utf-8')]))
+        offsets = self.read_offsets(signature)
+        if offsets is None:
+            offsets = self.build_offsets(csv_map, header, signature)
+        return (signature, csv_map, header, offsets, cache)
+
+    def read_offsets(self, signature):
+        """Returns the persisted offsets when they were built from this csv, None otherwise."""
+        try:
+            with open(students_offset_index, encoding='utf-8') as file:
+                saved = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        return saved["offsets"] if saved.get("signature") == signature else None
+
+    def build_offsets(self, csv_map, header, signature):
+        """Scans the csv once, recording the byte offset of every row, and persists the result."""
+        email_column = header.index("email_address")
+        offsets = {}
+        offset = csv_map.tell()
+        for line in iter(csv_map.readline, b""):
+            row = next(csv.reader([line.decode('utf-8')]), None)
+            if row:
+                offsets[row[email_column]] = offset
+            offset = csv_map.tell()
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(students_offset_index)), prefix=os.path.basename(students_offset_index), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({"signature": signature, "offsets": offsets}, file)
+            os.replace(temp_path, students_offset_index)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return offsets
+
+    def get(self, email_address):
+        """Returns the student obj for an email, parsing only its row."""
+        _, csv_map, header, offsets, cache = self.refresh()
+        student = cache.get(email_address)
+        if student is None:
+            offset = offsets[email_address]
+            end = csv_map.find(b"\n", offset)
+            line = csv_map[offset:end if end != -1 else len(csv_map)].decode('utf-8')
+            student = Student(**dict(zip(header, next(csv.reader([line])))))
+            cache.put(email_address, student)
+        return student
+
+
+class SqliteStudentIndex:
+    """Reads single students and course rosters through indexed sqlite queries."""
+
+    def __init__(self, storage):
+        """Initialize the index over a SqliteStorage"""
+        self.storage = storage
+
+    def available(self):
+        """Returns True, the tables are always queryable."""
+        return True
+
+    def get(self, email_address):
+        """Returns the student obj for an email, raising KeyError when missing."""
+        record = self.storage.get("students", email_address)
+        if record is None:
+            raise KeyError(email_address)
+        return Student(**record)
 
-    def display_students(self):
-        """Displays a list of all students."""
-        print("*********Students**************")
-        for student in self.students:
-            print(student)
-        print("*******************************")
+    def course_students(self, course_id):
+        """Returns (email_address, first_name, last_name, grade, marks) rows for a course."""
+        return self.storage.course_students(course_id)
+
+    def mark_stats(self, course_id):
+        """Returns the mark statistics of a course from its enrollment rows."""
+        return CourseMarkStats.from_sorted(self.storage.course_marks(course_id))
+
+
+@instrumented
+@synchronized
+class StudentManagement:
+    def __init__(self, journal=False, storage=None, offset_index=False, users=None):
+        """Initialize student management
+
+        Deleting a student also deletes their login from users, by default
+        the shared user manager, or one on the same storage when a storage
+        is given. With offset_index the roster is not loaded up front, get_student reads
+        single rows from student.csv, or from sqlite where course_students and
+        course_stats are also queries, and the first other access loads it all.
+        """
+        self.rw_lock = ReadWriteLock()
+        self.storage = storage or make_storage()
+        self.users = users or (user_management if storage is None else LazyManager(functools.partial(UserManagement, storage=self.storage)))
+        self.journal = journal
+        self.journal_entries = 0
+        self.journal_position = (None, 0)
+        self.use_search_index = True
+        self.version = 0
+        self.row_index = None
+        if offset_index and not os.path.exists(students_journal):
+            if isinstance(self.storage, CsvStorage) and not self.storage.shard_count("students"):
+                self.row_index = StudentCsvIndex(self.storage)
+            elif isinstance(self.storage, SqliteStorage):
+                self.row_index = SqliteStudentIndex(self.storage)
+        if self.row_index is not None:
+            self.reset_indexes()
+        else:
+            self.reload_students(force=True)
+
+    def __getattr__(self, name):
+        """Loads the full roster on first use in offset index mode."""
+        if name == "student_dict":
+            # Loaded directly, reload_students takes the write lock and this may run under a read lock
+            self.row_index = None
+            self.student_dict = {student.email_address: student for student in self.load_students()}
+            return self.student_dict
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    @property
+    def students(self):
+        """Returns student objs in roster order."""
+        return list(self.student_dict.values())
+
+    def load_students(self):
+        """Load student objs from storage"""
+        with gc_paused():
+            state = self.storage.load_snapshot("students") if isinstance(self.storage, CsvStorage) else None
+            if state is not None:
+                return [Student.from_state(*student) for student in state]
+            return [Student(*row) for row in self.storage.load_rows("students")]
+
+    def save_students(self, data, changed=None, removed=None):
+        """Saves student objs in storage"""
+        if changed is None and removed is None:
+            # A full save replaces the table, memory now mirrors what was saved
+            data = list(data)
+            self.student_dict = {student.email_address: student for student in data}
+            self.reset_indexes()
+        if changed is not None:
+            changed = [student.to_dict() for student in changed]
+        with self.rw_lock.sharing():
+            self.storage.save("students", (student.to_dict() for student in data), changed, removed)
+        self.reload_students()
+        if isinstance(self.storage, CsvStorage) and self.storage.snapshots and self.row_index is None:
+            # Memory now mirrors the csv this storage last saw
+            with self.rw_lock.sharing():
+                self.storage.write_snapshot("students", [student.state() for student in self.student_dict.values()])
+        self.clear_journal()
+
+    def reload_students(self, force=False):
+        """Reloads student objs when another process changed the stored table.
+
+        After this manager's own saves memory is already current, so the
+        check is a stat of the csv (or the sqlite table generation), not a re-parse.
+        """
+        if not force and (self.row_index is not None or not self.storage.is_stale("students")):
+            return
+        self.student_dict = {student.email_address: student for student in self.load_students()}
+        self.replay_journal()
+        self.reset_indexes()
+
+    def reset_indexes(self):
+        """Drops the in-memory indexes, they are rebuilt on first use."""
+        self.search_index = None
+        self.course_index = None
+        self.page_index = None
+        self.version += 1
+
+    def index_student(self, student, moved=False):
+        """Updates the in-memory indexes for an added or changed student, moved when it went to the end of the roster."""
+        self.version += 1
+        if self.search_index is not None:
+            self.search_index.add(student, moved)
+        if self.course_index is not None:
+            self.course_index.add(student)
+        if self.page_index is not None:
+            self.page_index.update(changed=[student.email_address])
+
+    def unindex_student(self, email_address):
+        """Removes a student from the in-memory indexes."""
+        self.version += 1
+        if self.search_index is not None:
+            self.search_index.remove(email_address)
+        if self.course_index is not None:
+            self.course_index.remove(email_address)
+        if self.page_index is not None:
+            self.page_index.update(removed=[email_address])
+
+    def get_course_index(self):
+        """Returns the course enrollment index, building it on first use."""
+        if self.course_index is None:
+            self.course_index = CourseEnrollmentIndex(self.student_dict.values())
+        return self.course_index
+
+    def write_journal(self, op, record):
+        """Appends one mutation record to the student journal."""
+        line = (json.dumps({"op": op, "record": record}) + "\n").encode('utf-8')
+        with file_locked(students_journal + ".lock", exclusive=True):
+            with open(students_journal, 'ab') as file:
+                inode, offset = self.journal_position
+                stat = os.fstat(file.fileno())
+                # The record counts as consumed only when no other process appended since this one read
+                if stat.st_size == 0:
+                    self.journal_position = (stat.st_ino, len(line))
+                elif stat.st_ino == inode and stat.st_size == offset:
+                    self.journal_position = (inode, offset + len(line))
+                file.write(line)
+        if metrics.enabled:
+            metrics.record_bytes("written", "students_journal", len(line))
+        self.journal_entries += 1
+        if self.journal_entries >= journal_compact_threshold:
+            self.compact_journal()
+
+    def replay_journal(self, resume=False):
+        """Applies journal records on top of the csv snapshot, with resume only those after the last one read."""
+        inode, offset = self.journal_position if resume else (None, 0)
+        if not resume:
+            self.journal_entries = 0
+            self.journal_position = (None, 0)
+        try:
+            file = open(students_journal, 'rb')
+        except FileNotFoundError:
+            return
+        with file:
+            if os.fstat(file.fileno()).st_ino != inode:
+                inode, offset = os.fstat(file.fileno()).st_ino, 0
+            file.seek(offset)
+            for line in file:
+                try:
+                    entry = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    entry = None
+                if entry is None:
+                    # A torn last line from an interrupted or ongoing append
+                    break
+                offset += len(line)
+                self.journal_position = (inode, offset)
+                if entry["op"] == "put":
+                    student = Student(**entry["record"])
+                    self.student_dict.pop(student.email_address, None)
+                    self.student_dict[student.email_address] = student
+                elif entry["op"] == "delete":
+                    self.student_dict.pop(entry["record"], None)
+                self.journal_entries += 1
+
+    def clear_journal(self):
+        """Drops the journal records this manager read or wrote, they are now part of the csv snapshot.
+
+        Records other processes appended since then are kept for the next replay.
+        """
+        inode, offset = self.journal_position
+        if os.path.exists(students_journal):
+            with file_locked(students_journal + ".lock", exclusive=True):
+                self.truncate_journal(inode, offset)
+        self.journal_position = (None, 0)
+        self.journal_entries = 0
+
+    def truncate_journal(self, inode, offset):
+        """Removes the first offset bytes of the journal generation inode, or the whole journal when nothing follows them."""
+        try:
+            file = open(students_journal, 'rb')
+        except FileNotFoundError:
+            return
+        with file:
+            stat = os.fstat(file.fileno())
+            consumed = offset if stat.st_ino == inode else 0
+            file.seek(consumed)
+            rest = file.read()
+        if not rest:
+            os.remove(students_journal)
+        elif consumed:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(students_journal)), prefix=os.path.basename(students_journal), suffix=".tmp")
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(rest)
+            os.replace(temp_path, students_journal)
+
+    def compact_journal(self):
+        """Folds the journal, with the records other managers appended since this one read it, into student.csv."""
+        if self.storage.is_stale("students"):
+            self.reload_students(force=True)
+        else:
+            self.replay_journal(resume=True)
+            self.reset_indexes()
+        self.save_students(self.student_dict.values())
+
+    def display_given_students(self, students):
+        """Displays a list of specific students, one write per page."""
+        students = list(students)
+        for start in range(0, max(len(students), 1), display_page_size):
+            render_table("Students", [student.to_dict() for student in students[start:start + display_page_size]], table_fields["students"])
+
+    def list_students(self, page_size=display_page_size, offset=0, after=None):
+        """Returns (student objs, cursor) of one page ordered by email."""
+        if self.page_index is None:
+            self.page_index = PageIndex(self.student_dict)
+        emails, cursor = self.page_index.page(page_size, offset, after)
+        return [self.student_dict[email] for email in emails], cursor
+
+    def display_students(self, page_size=display_page_size, offset=0, after=None):
+        """Displays one page of students, returns the cursor of the next page."""
+        students, cursor = self.list_students(page_size, offset, after)
+        render_table("Students", [student.to_dict() for student in students], table_fields["students"])
+        return cursor
 
     def get_student(self, email_address):
         """Finds and returns a student by their email."""
+        if self.row_index is not None and self.row_index.available():
+            return self.row_index.get(email_address)
         return self.student_dict[email_address]
 
-    def get_students(self, search_key):
-        """Searches for students by name, email, or course details."""
+    def get_students(self, search_key, use_index=None):
+        """Searches for students by name, email, or course details, in roster order."""
+        if use_index is None:
+            use_index = self.use_search_index
+        if use_index:
+            if self.search_index is None:
+                self.search_index = StudentSearchIndex(self.student_dict.values())
+            candidates = self.search_index.candidates(search_key)
+            if candidates is not None:
+                students = [self.student_dict[email] for email in sorted(candidates, key=self.search_index.positions.__getitem__)]
+                return [student for student in students if any(search_key in field for field in student.search_fields())]
         student_list = []
         for student in self.students:
             if search_key in student.first_name or \
             search_key in student.last_name or \
             search_key in student.email_address or \
             search_key in student.courses or \
-            search_key in student.courses or \
             search_key in student.marks or \
             search_key in student.grades:
                 student_list.append(student)
         return student_list
 
+    def query_index(self, predicate, group):
+        """Returns (estimated rows, fetch, description) of the index serving a predicate, None when none does.
+
+        fetch() returns the candidate emails.
+        """
+        field, op, value, term = predicate
+        if field == "email_address":
+            if op == "=":
+                return (1 if value in self.student_dict else 0), lambda: {value} & self.student_dict.keys(), f"email hash {term}"
+            if op == "prefix":
+                if self.page_index is None:
+                    self.page_index = PageIndex(self.student_dict)
+                keys = self.page_index.keys
+                start, end = bisect.bisect_left(keys, value), bisect.bisect_left(keys, value + key_end)
+                return end - start, lambda: set(keys[start:end]), f"sorted emails {term}"
+        if field == "course":
+            course_index = self.get_course_index()
+            course_ids = [value] if op == "=" else [course_id for course_id in course_index.courses if course_id.startswith(value)]
+            if op in ("=", "prefix"):
+                return (sum(len(course_index.enrollments(course_id)) for course_id in course_ids),
+                        lambda: {email for course_id in course_ids for email in course_index.enrollments(course_id)},
+                        f"course members {term}")
+        if field in ("grade", "marks"):
+            course_index = self.get_course_index()
+            bound = [value for bound_field, bound_op, value, _ in group if bound_field == "course" and bound_op == "="]
+            course_ids = bound[:1] or list(course_index.courses)
+            if field == "grade":
+                low, high = ((value,), (value, key_end)) if op == "=" else ((value,), (value + key_end,))
+            else:
+                low, high = {"=": ((value,), (value + 1,)), ">=": ((value,), (float("inf"),)), ">": ((value + 1,), (float("inf"),)),
+                             "<=": ((float("-inf"),), (value + 1,)), "<": ((float("-inf"),), (value,))}[op]
+            orders = [course_index.order(course_id) for course_id in course_ids]
+            where = f"of {course_ids[0]}" if bound else "of every course"
+            return (sum(order.span_size(field, low, high) for order in orders),
+                    lambda: {email for order in orders for email in order.span(field, low, high)},
+                    f"sorted {field} {where} {term}")
+        if field in ("first_name", "last_name", "any"):
+            # Equal, prefix and contained values are all substrings, trigrams give a superset
+            if self.search_index is None:
+                self.search_index = StudentSearchIndex(self.student_dict.values())
+            candidates = self.search_index.candidates(value)
+            if candidates is not None:
+                return len(candidates), lambda: candidates, f"trigrams {term}"
+        return None
+
+    def plan_query(self, text):
+        """Plans a student query, returns per OR group (group, [(estimate, fetch, description)]).
+
+        Each group starts from its most selective index and intersects the
+        next ones while they are at most query_intersect_ratio times larger
+        than the smallest; the rest is checked on the candidates. A group
+        with no usable index scans every student.
+        """
+        plans = []
+        for group in parse_student_query(text):
+            indexes = sorted((index for index in (self.query_index(predicate, group) for predicate in group) if index is not None), key=lambda index: index[0])
+            if indexes:
+                indexes = [index for index in indexes if index[0] <= indexes[0][0] * query_intersect_ratio or index is indexes[0]]
+            plans.append((group, indexes))
+        return plans
+
+    def query_students(self, text):
+        """Returns the students matching a query, ordered by email."""
+        matches = {}
+        for group, indexes in self.plan_query(text):
+            if indexes:
+                candidates = indexes[0][1]()
+                for _, fetch, _ in indexes[1:]:
+                    candidates = candidates & fetch()
+            else:
+                candidates = self.student_dict
+            for email_address in candidates:
+                student = self.student_dict[email_address]
+                if email_address not in matches and match_student_query(student, group):
+                    matches[email_address] = student
+        return [matches[email_address] for email_address in sorted(matches)]
+
+    def explain_query(self, text):
+        """Returns the plan query_students follows for a query."""
+        lines = []
+        for number, (group, indexes) in enumerate(self.plan_query(text), 1):
+            lines.append(f"group {number}: {' AND '.join(predicate[3] for predicate in group)}")
+            if not indexes:
+                lines.append(f"  scan all {len(self.student_dict)} students")
+            for step, (estimate, _, description) in enumerate(indexes):
+                lines.append(f"  {'index' if step == 0 else 'intersect'} {description} (~{estimate} rows)")
+            lines.append(f"  check {len(group)} predicates on each candidate")
+        return "\n".join(lines)
+
     def add_new_student(self, student):
         """Adds a new student to list, dioct and csv."""
         self.student_dict[student.email_address] = student
-        self.save_students(self.student_dict.values())
+        self.index_student(student)
+        if self.journal:
+            self.write_journal("put", student.to_dict())
+        else:
+            self.save_students(self.student_dict.values(), changed=[student])
 
     def delete_student(self, email_address):
-        """Removes a student from list, dioct and csv."""
+        """Removes a student from list, dioct and csv, and their login."""
         self.student_dict.pop(email_address)
-        self.save_students(self.student_dict.values())
+        self.unindex_student(email_address)
+        if self.journal:
+            self.write_journal("delete", email_address)
+        else:
+            self.save_students(self.student_dict.values(), removed=[email_address])
+        if self.users.check_user(email_address):
+            self.users.delete_user(email_address)
+
+    def delete_course_enrollments(self, course_id):
+        """Drops a course from every enrolled student with a single save, returns how many changed."""
+        return self.change_enrollments(course_id, lambda student: student.remove_course(course_id))
+
+    def update_course_id(self, course_id, new_course_id):
+        """Renames a course for every enrolled student with a single save, returns how many changed."""
+        return self.change_enrollments(course_id, lambda student: student.rename_course(course_id, new_course_id))
+
+    def change_enrollments(self, course_id, change):
+        """Applies change to the students enrolled in a course, found through the course index."""
+        students = [self.student_dict[email_address] for email_address in list(self.get_course_index().enrollments(course_id))]
+        for student in students:
+            change(student)
+            self.index_student(student)
+        if self.journal:
+            for student in students:
+                self.write_journal("put", student.to_dict())
+        elif students:
+            self.save_students(self.student_dict.values(), changed=students)
+        return len(students)
 
     def update_student(self, student):
         """Updates student in list, dioct and csv."""
         self.student_dict.pop(student.email_address)
         self.student_dict[student.email_address] = student
-        self.save_students(self.student_dict.values())
+        self.index_student(student, moved=True)
+        if self.journal:
+            self.write_journal("put", student.to_dict())
+        else:
+            # Removed and changed, the stored row moves to the end like the roster's
+            self.save_students(self.student_dict.values(), changed=[student], removed=[student.email_address])
+
+    def import_students(self, students):
+        """Adds or replaces a batch of students with a single save."""
+        students = list(students)
+        for student in students:
+            self.student_dict.pop(student.email_address, None)
+            self.student_dict[student.email_address] = student
+            self.index_student(student, moved=True)
+        if self.journal:
+            for student in students:
+                self.write_journal("put", student.to_dict())
+        elif students:
+            self.save_students(self.student_dict.values(), changed=students, removed=[student.email_address for student in students])
 
     def assign_course(self, student, course_id):
         """Assigns a course to a student."""
-        if course_id not in student.course_list():
+        if course_id not in student.enrollments:
             student.add_course(course_id)
             self.update_student(student)
         else:
@@ -203,10 +2135,8 @@ class StudentManagement:
 
     def add_grade(self, student, course_id, grade, marks):
         """Assigns a grade and marks to a student for a course."""
-        student_course_dict = student.course_dict()
-        if course_id in student_course_dict:
-            student_course_dict[course_id] = {"grade": grade, "marks": marks}
-            student.course_dict_to_string(student_course_dict)
+        if course_id in student.enrollments:
+            student.set_result(course_id, grade, marks)
             self.update_student(student)
         else:
             print("*******Error, student not part of the course*********")
@@ -215,24 +2145,90 @@ class StudentManagement:
         """Retrieves a list of students enrolled in a course."""
         student_list = []
         student_dict = {}
-        for student in self.students:
-            course_dict = student.course_dict()
-            if course_id in course_dict:
-                student_list.append(f"Student Email: {student.email_address} Name: {student.first_name} {student.last_name}, Grade: {course_dict[course_id]["grade"]}, Marks: {course_dict[course_id]["marks"]}")
-                student_dict[student.email_address] = {"email_address": f"{student.email_address}","name": f"{student.first_name} {student.last_name}", "grade": course_dict[course_id]["grade"], "marks": course_dict[course_id]["marks"]}
+        if isinstance(self.row_index, SqliteStudentIndex):
+            rows = self.row_index.course_students(course_id)
+        else:
+            rows = []
+            for email_address, (grade, _) in self.get_course_index().enrollments(course_id).items():
+                student = self.student_dict[email_address]
+                rows.append((email_address, student.first_name, student.last_name, grade, student.enrollments[course_id].stored_marks()))
+        for email_address, first_name, last_name, grade, marks in rows:
+            marks = "" if marks is None else str(marks)
+            student_list.append(f"Student Email: {email_address} Name: {first_name} {last_name}, Grade: {grade}, Marks: {marks}")
+            student_dict[email_address] = {"email_address": f"{email_address}","name": f"{first_name} {last_name}", "grade": grade, "marks": marks}
         return student_list, student_dict
 
     def course_mark_stats(self, student_dict):
         """Calculates and returns course statistics (min, max, avg, median)."""
         stats =  {"min": 0, "max": 0, "avg":0, "median": 0}
-        marks_list = [int(student_dict[student]["marks"]) for student in student_dict if student_dict[student]["marks"]]
-        if student_dict:
+        marks_list = [parse_marks(student_dict[student]["marks"]) for student in student_dict]
+        marks_list = [marks for marks in marks_list if marks is not None]
+        if marks_list:
             stats["min"] = min(marks_list)
             stats["max"] = max(marks_list)
             stats["avg"] = sum(marks_list)/len(marks_list)
             stats['median'] = statistics.median(marks_list)
         return stats
 
+    def course_stats(self, course_id):
+        """Returns course statistics from the running per-course accumulator, or a sqlite query."""
+        if isinstance(self.row_index, SqliteStudentIndex):
+            return self.row_index.mark_stats(course_id).summary()
+        return self.get_course_index().mark_stats(course_id).summary()
+
+    def update_letter_grades(self, grade_for_marks, course_ids=None):
+        """Re-derives letter grades from marks for some or all courses with a single save.
+
+        Enrollments without marks, or with marks outside every range, keep
+        their grade. Returns the number of students changed.
+        """
+        course_index = self.get_course_index()
+        changed = {}
+        for course_id in list(course_index.courses) if course_ids is None else course_ids:
+            for email_address, (grade, marks) in list(course_index.enrollments(course_id).items()):
+                if marks is None:
+                    continue
+                new_grade = grade_for_marks(marks)
+                if new_grade is not None and new_grade != grade:
+                    student = self.student_dict[email_address]
+                    student.set_result(course_id, new_grade, marks)
+                    changed[email_address] = student
+        for student in changed.values():
+            self.index_student(student)
+        if changed:
+            if self.journal:
+                for student in changed.values():
+                    self.write_journal("put", student.to_dict())
+            else:
+                self.save_students(self.student_dict.values(), changed=list(changed.values()))
+        return len(changed)
+
+    def sorted_course_students(self, course_id, order, offset=0, limit=None, descending=False):
+        """Returns one page of a course report sorted by grade, email or marks.
+
+        Rows have the course_students dict format. The marks order holds the
+        students with numeric marks, the unmarked order the others by email.
+        """
+        course_index = self.get_course_index()
+        rows = []
+        for email_address in course_index.order(course_id).page(order, offset, limit, descending):
+            student = self.student_dict[email_address]
+            enrollment = student.enrollments[course_id]
+            rows.append({"email_address": email_address, "name": f"{student.first_name} {student.last_name}", "grade": enrollment.grade, "marks": enrollment.stored_marks()})
+        return rows
+
+    def top_students(self, course_id, k):
+        """Returns the k students with the highest marks in a course."""
+        return self.sorted_course_students(course_id, "marks", limit=k, descending=True)
+
+    def bottom_students(self, course_id, k):
+        """Returns the k students with the lowest marks in a course."""
+        return self.sorted_course_students(course_id, "marks", limit=k)
+
+    def student_rank(self, course_id, email_address):
+        """Returns (rank, percentile) of a student's marks in a course, None without marks."""
+        return self.get_course_index().rank(course_id, email_address)
+
 
 class Professor:
     def __init__(self, name, email_address, rank, courses=""):
@@ -279,53 +2275,103 @@ class Professor:
         }
 
 
+@instrumented
+@synchronized
 class ProfessorManagement:
-    """Initialize professor management"""
-    def __init__(self):
-        self.professors = self.load_professors()
-        self.professor_dict = {professor.email_address: professor for professor in self.professors}
+    """Initialize professor management, deletes cascade to the logins in users or a user manager on the same storage"""
+    def __init__(self, storage=None, users=None):
+        self.rw_lock = ReadWriteLock()
+        self.storage = storage or make_storage()
+        self.users = users or (user_management if storage is None else LazyManager(functools.partial(UserManagement, storage=self.storage)))
+        self.reload_professors(force=True)
+
+    @property
+    def professors(self):
+        """Returns professor objs in roster order."""
+        return list(self.professor_dict.values())
 
     def load_professors(self):
-        """Load professor objs from csv"""
-        if os.path.exists(professors_csv):
-            with open(professors_csv, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                professors = [Professor(**record) for record in reader]
-                return professors
-        return []
-
-    def save_professors(self, data):
-        """Save professor objs to csv"""
-        data = [professor.to_dict() for professor in data]
-        fieldnames = data[0].keys()
-        with open(professors_csv, 'w') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in data:
-                writer.writerow(record)
+        """Load professor objs from storage"""
+        return [Professor(*row) for row in self.storage.load_rows("professors")]
+
+    def save_professors(self, data, changed=None, removed=None):
+        """Save professor objs to storage"""
+        if changed is None and removed is None:
+            # A full save replaces the table, memory now mirrors what was saved
+            data = list(data)
+            self.professor_dict = {professor.email_address: professor for professor in data}
+            self.page_index = None
+            self.course_index = None
+        else:
+            if self.page_index is not None:
+                self.page_index.update([professor.email_address for professor in changed or ()], removed or ())
+            if self.course_index is not None:
+                for email_address in removed or ():
+                    self.course_index.remove(email_address)
+                for professor in changed or ():
+                    self.course_index.add(professor.email_address, professor.course_list())
+        if changed is not None:
+            changed = [professor.to_dict() for professor in changed]
+        with self.rw_lock.sharing():
+            self.storage.save("professors", (professor.to_dict() for professor in data), changed, removed)
         self.reload_professors()
 
-    def reload_professors(self):
-        """Reload professor objs"""
-        self.professors = self.load_professors()
-        self.professor_dict = {professor.email_address: professor for professor in self.professors}
-
-    def display_professors(self):
-        """Display professor objs"""
-        print("*********Professors**************")
-        for professor in self.professors:
-            print(professor)
-        print("*******************************")
+    def reload_professors(self, force=False):
+        """Reload professor objs when another process changed the stored table"""
+        if not force and not self.storage.is_stale("professors"):
+            return
+        self.professor_dict = {professor.email_address: professor for professor in self.load_professors()}
+        self.page_index = None
+        self.course_index = None
+
+    def get_course_index(self):
+        """Returns the course -> teaching professors index, building it on first use."""
+        if self.course_index is None:
+            self.course_index = CourseMembershipIndex((professor.email_address, professor.course_list()) for professor in self.professor_dict.values())
+        return self.course_index
+
+    def list_professors(self, page_size=display_page_size, offset=0, after=None):
+        """Returns (professor objs, cursor) of one page ordered by email."""
+        if self.page_index is None:
+            self.page_index = PageIndex(self.professor_dict)
+        keys, cursor = self.page_index.page(page_size, offset, after)
+        return [self.professor_dict[key] for key in keys], cursor
+
+    def display_professors(self, page_size=display_page_size, offset=0, after=None):
+        """Displays one page of professor objs, returns the cursor of the next page."""
+        professors, cursor = self.list_professors(page_size, offset, after)
+        render_table("Professors", [professor.to_dict() for professor in professors], table_fields["professors"])
+        return cursor
 
     def add_new_professor(self, professor):
         """Adds new professor to list, dict and csv"""
         self.professor_dict[professor.email_address] = professor
-        self.save_professors(self.professor_dict.values())
+        self.save_professors(self.professor_dict.values(), changed=[professor])
 
     def delete_professor(self, email_address):
-        """Deletes existing professor from list, dict and csv"""
+        """Deletes existing professor from list, dict and csv, and their login"""
         self.professor_dict.pop(email_address)
-        self.save_professors(self.professor_dict.values())
+        self.save_professors(self.professor_dict.values(), removed=[email_address])
+        if self.users.check_user(email_address):
+            self.users.delete_user(email_address)
+
+    def delete_course_assignments(self, course_id):
+        """Drops a course from every professor teaching it with a single save, returns how many changed"""
+        return self.change_course_assignments(course_id, None)
+
+    def update_course_id(self, course_id, new_course_id):
+        """Renames a course for every professor teaching it with a single save, returns how many changed"""
+        return self.change_course_assignments(course_id, new_course_id)
+
+    def change_course_assignments(self, course_id, new_course_id):
+        """Replaces or, when new_course_id is None, drops a course in the professors teaching it"""
+        professors = [self.professor_dict[email_address] for email_address in list(self.get_course_index().members(course_id))]
+        for professor in professors:
+            course_list = [new_course_id if course == course_id else course for course in professor.course_list()]
+            professor.courses = ",".join(course for course in course_list if course is not None)
+        if professors:
+            self.save_professors(self.professor_dict.values(), changed=professors)
+        return len(professors)
 
     def get_professor(self, email_address):
         """Gets professor given email_address"""
@@ -343,11 +2389,13 @@ class ProfessorManagement:
         """Updates professor"""
         self.professor_dict.pop(professor.email_address)
         self.professor_dict[professor.email_address] = professor
-        self.save_professors(self.professor_dict.values())
+        self.save_professors(self.professor_dict.values(), changed=[professor])
 
     def add_student_grade(self, student_email, course_id, grade, marks):
-        """Adds grade to a student"""
+        """Adds grade to a student, a blank grade is looked up from the marks"""
         try:
+            if not grade:
+                grade = grade_management.grade_for_marks(int(marks)) or ""
             student = student_management.get_student(student_email)
             student_management.add_grade(student, course_id, grade, marks)
         except Exception as e:
@@ -378,33 +2426,42 @@ class User:
         return {"user_id": self.user_id, "password": self.password, "role": self.role}
 
 
+@instrumented
+@synchronized
 class UserManagement:
-    def __init__(self):
+    def __init__(self, storage=None):
         """Initializes user management."""
-        self.users = self.load_users()
-        self.users_dict = {user.user_id: user for user in self.users}
+        self.rw_lock = ReadWriteLock()
+        self.storage = storage or make_storage()
+        self.reload_users(force=True)
 
-    def load_users(self):
-        """Loads user objs from csv."""
-        if os.path.exists(users_csv):
-            with open(users_csv, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                users = [User(**record) for record in reader]
-                return users
-        return []
+    @property
+    def users(self):
+        """Returns user objs in insertion order."""
+        return list(self.users_dict.values())
 
-    def view_users(self):
-        """Displays user objs."""
-        print("*********Users**************")
+    def load_users(self):
+        """Loads user objs from storage."""
+        return [User(*row) for row in self.storage.load_rows("users")]
+
+    def list_users(self, page_size=display_page_size, offset=0, after=None):
+        """Returns (user objs, cursor) of one page ordered by user id."""
+        if self.page_index is None:
+            self.page_index = PageIndex(self.users_dict)
+        keys, cursor = self.page_index.page(page_size, offset, after)
+        return [self.users_dict[key] for key in keys], cursor
+
+    def view_users(self, page_size=display_page_size, offset=0, after=None):
+        """Displays one page of user objs, returns the cursor of the next page."""
+        users, cursor = self.list_users(page_size, offset, after)
+        render_table("Users", [user.to_dict() for user in users], table_fields["users"])
         print("Students are of type student, Professors are of type professor")
-        for user in self.users:
-            print(user)
-        print("*******************************")
+        return cursor
 
     def add_user(self, user):
         """Adds user obj to list, dict and csv."""
         self.users_dict[user.user_id] = user
-        self.save_users(self.users_dict.values())
+        self.save_users(self.users_dict.values(), changed=[user])
 
     def check_user(self, user_id):
         """Checks for user in dict."""
@@ -417,28 +2474,34 @@ class UserManagement:
     def update_user(self, user):
         """Updates user obj in list, dict and csv."""
         self.users_dict[user.user_id] = user
-        self.save_users(self.users_dict.values())
+        self.save_users(self.users_dict.values(), changed=[user])
 
     def delete_user(self, user_id):
         """Deletes user obj in list, dict and csv."""
         self.users_dict.pop(user_id)
-        self.save_users(self.users_dict.values())
-
-    def save_users(self, data):
-        """Saves user obj to csv."""
-        data = [user.to_dict() for user in data]
-        fieldnames = data[0].keys()
-        with open(users_csv, 'w') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in data:
-                writer.writerow(record)
+        self.save_users(self.users_dict.values(), removed=[user_id])
+
+    def save_users(self, data, changed=None, removed=None):
+        """Saves user obj to storage."""
+        if changed is None and removed is None:
+            # A full save replaces the table, memory now mirrors what was saved
+            data = list(data)
+            self.users_dict = {user.user_id: user for user in data}
+            self.page_index = None
+        elif self.page_index is not None:
+            self.page_index.update([user.user_id for user in changed or ()], removed or ())
+        if changed is not None:
+            changed = [user.to_dict() for user in changed]
+        with self.rw_lock.sharing():
+            self.storage.save("users", (user.to_dict() for user in data), changed, removed)
         self.reload_users()
 
-    def reload_users(self):
-        """Reloads user objs."""
-        self.users = self.load_users()
-        self.users_dict = {user.user_id: user for user in self.users}
+    def reload_users(self, force=False):
+        """Reloads user objs when another process changed the stored table."""
+        if not force and not self.storage.is_stale("users"):
+            return
+        self.users_dict = {user.user_id: user for user in self.load_users()}
+        self.page_index = None
 
     def login(self, user_id, password, user_input):
         """User login give user_id and password."""
@@ -462,9 +2525,9 @@ class UserManagement:
         """Decrypts and verify's user password."""
         return hashed_password == self.encrypt_password(password)
 
-user_management = UserManagement()
-student_management = StudentManagement()
-professor_management = ProfessorManagement()
+user_management = LazyManager(UserManagement)
+student_management = LazyManager(functools.partial(StudentManagement, offset_index=True))
+professor_management = LazyManager(ProfessorManagement)
 
 class Course:
     def __init__(self, course_id, credits, course_name, course_desc):
@@ -492,65 +2555,138 @@ class Course:
         }
 
 
+@instrumented
+@synchronized
 class CourseManagement:
-    def __init__(self):
-        """Initialize course management."""
-        self.courses = self.load_courses()
-        self.course_dict = {course.course_id: course for course in self.courses}
+    def __init__(self, storage=None, students=None, professors=None):
+        """Initialize course management, deletes and renames cascade to the given or shared student and professor managers."""
+        self.rw_lock = ReadWriteLock()
+        self.storage = storage or make_storage()
+        self.students = students or student_management
+        self.professors = professors or professor_management
+        self.version = 0
+        self.reload_courses(force=True)
 
     def get_course(self, course_id):
         """Gets course obj"""
         return self.course_dict[course_id]
 
-    def load_courses(self):
-        """Gets course objs from csv."""
-        if os.path.exists(courses_csv):
-            with open(courses_csv, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                courses = [Course(**record) for record in reader]
-                return courses
-        return []
+    @property
+    def courses(self):
+        """Returns course objs in catalog order."""
+        return list(self.course_dict.values())
 
-    def save_courses(self, data):
-        """Saves course objs to csv."""
-        data = [course.to_dict() for course in data]
-        fieldnames = data[0].keys()
-        with open(courses_csv, 'w') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in data:
-                writer.writerow(record)
+    def load_courses(self):
+        """Gets course objs from storage."""
+        return [Course(*row) for row in self.storage.load_rows("courses")]
+
+    def save_courses(self, data, changed=None, removed=None):
+        """Saves course objs to storage."""
+        if changed is None and removed is None:
+            # A full save replaces the table, memory now mirrors what was saved
+            data = list(data)
+            self.course_dict = {course.course_id: course for course in data}
+            self.page_index = None
+        elif self.page_index is not None:
+            self.page_index.update([course.course_id for course in changed or ()], removed or ())
+        if changed is not None:
+            changed = [course.to_dict() for course in changed]
+        with self.rw_lock.sharing():
+            self.storage.save("courses", (course.to_dict() for course in data), changed, removed)
+        self.version += 1
         self.reload_courses()
 
-    def reload_courses(self):
-        """Reloads course objs."""
-        self.courses = self.load_courses()
-        self.course_dict = {courses.course_id: courses for courses in self.courses}
-
-    def display_courses(self):
-        """Displays course objs."""
-        print("*********Courses**************")
-        for course in self.courses:
-            print(course)
-        print("*******************************")
+    def reload_courses(self, force=False):
+        """Reloads course objs when another process changed the stored table."""
+        if not force and not self.storage.is_stale("courses"):
+            return
+        self.course_dict = {course.course_id: course for course in self.load_courses()}
+        self.page_index = None
+        self.version += 1
+
+    def list_courses(self, page_size=display_page_size, offset=0, after=None):
+        """Returns (course objs, cursor) of one page ordered by course id."""
+        if self.page_index is None:
+            self.page_index = PageIndex(self.course_dict)
+        keys, cursor = self.page_index.page(page_size, offset, after)
+        return [self.course_dict[key] for key in keys], cursor
+
+    def display_courses(self, page_size=display_page_size, offset=0, after=None):
+        """Displays one page of course objs, returns the cursor of the next page."""
+        courses, cursor = self.list_courses(page_size, offset, after)
+        render_table("Courses", [course.to_dict() for course in courses], table_fields["courses"])
+        return cursor
 
     def add_new_course(self, course):
         """Adds new course."""
         self.course_dict[course.course_id] = course
-        self.save_courses(self.course_dict.values())
+        self.save_courses(self.course_dict.values(), changed=[course])
 
     def update_course(self, course):
         """Updates existing course."""
         self.course_dict[course.course_id] = course
-        self.save_courses(self.course_dict.values())
+        self.save_courses(self.course_dict.values(), changed=[course])
 
     def delete_course(self, course_id):
-        """Delets a course."""
+        """Delets a course and drops it from the students taking and professors teaching it."""
         self.course_dict.pop(course_id)
-        self.save_courses(self.course_dict.values())
-
-
-course_management = CourseManagement()
+        self.save_courses(self.course_dict.values(), removed=[course_id])
+        self.students.delete_course_enrollments(course_id)
+        self.professors.delete_course_assignments(course_id)
+
+    def rename_course(self, course_id, new_course_id):
+        """Changes a course id, along with the students taking and professors teaching it."""
+        if new_course_id in self.course_dict:
+            raise ValueError(f"course {new_course_id} already exists")
+        course = self.course_dict.pop(course_id)
+        course.course_id = new_course_id
+        self.course_dict[new_course_id] = course
+        self.save_courses(self.course_dict.values(), changed=[course], removed=[course_id])
+        self.students.update_course_id(course_id, new_course_id)
+        self.professors.update_course_id(course_id, new_course_id)
+
+
+course_management = LazyManager(CourseManagement)
+
+
+def parse_marks_range(marks_range):
+    """Returns (low, high) of a marks range like "100 to 90" or "90-100", None when unreadable."""
+    for separator in ("to", "-"):
+        bounds = marks_range.split(separator)
+        if len(bounds) == 2:
+            low, high = parse_marks(bounds[0].strip()), parse_marks(bounds[1].strip())
+            if low is not None and high is not None:
+                return min(low, high), max(low, high)
+    return None
+
+
+class GradeIntervalIndex:
+    """Marks ranges of the grade catalog sorted by lower bound for bisect lookup.
+
+    Catalog ranges overlap at their bounds ("100 to 90", "91 to 80"), so
+    marks map to the range with the highest lower bound that contains them.
+    """
+
+    def __init__(self, grades=()):
+        """Initialize the index from grade objs, unreadable ranges are skipped"""
+        intervals = []
+        for grade in grades:
+            bounds = parse_marks_range(grade.marks_range)
+            if bounds is not None:
+                intervals.append((bounds[0], bounds[1], grade.grade))
+        intervals.sort()
+        self.lows = [low for low, _, _ in intervals]
+        self.intervals = intervals
+
+    def grade_for_marks(self, marks):
+        """Returns the letter grade of marks, None outside every range."""
+        index = bisect.bisect_right(self.lows, marks) - 1
+        while index >= 0:
+            _, high, grade = self.intervals[index]
+            if marks <= high:
+                return grade
+            index -= 1
+        return None
 
 
 class Grade:
@@ -572,61 +2708,516 @@ class Grade:
             "marks_range": self.marks_range,
         }
 
+@instrumented
+@synchronized
 class GradeManagement:
-    def __init__(self):
-        """Initialize grade management"""
-        self.grades = self.load_grades()
-        self.grade_dict = {grade.grade_id: grade for grade in self.grades}
-        self.save_grades(self.grade_dict.values())
+    def __init__(self, storage=None, auto_regrade=False):
+        """Initialize grade management
+
+        With auto_regrade every catalog change re-derives the students'
+        letter grades from their marks.
+        """
+        self.rw_lock = ReadWriteLock()
+        self.storage = storage or make_storage()
+        self.auto_regrade = auto_regrade
+        self.version = 0
+        self.reload_grades(force=True)
+
+    @property
+    def grades(self):
+        """Returns grade objs in catalog order."""
+        return list(self.grade_dict.values())
 
     def load_grades(self):
-        """Loads grade objs from csv"""
-        if os.path.exists(grades_csv):
-            with open(grades_csv, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                grades = [Grade(**record) for record in reader]
-                return grades
-        return []
-
-    def save_grades(self, data):
-        """Saves grade objs to csv"""
-        data = [grade.to_dict() for grade in data]
-        fieldnames = data[0].keys()
-        with open(grades_csv, 'w') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in data:
-                writer.writerow(record)
+        """Loads grade objs from storage"""
+        return [Grade(*row) for row in self.storage.load_rows("grades")]
+
+    def save_grades(self, data, changed=None, removed=None):
+        """Saves grade objs to storage"""
+        if changed is None and removed is None:
+            # A full save replaces the table, memory now mirrors what was saved
+            data = list(data)
+            self.grade_dict = {grade.grade_id: grade for grade in data}
+            self.page_index = None
+        elif self.page_index is not None:
+            self.page_index.update([grade.grade_id for grade in changed or ()], removed or ())
+        if changed is not None:
+            changed = [grade.to_dict() for grade in changed]
+        with self.rw_lock.sharing():
+            self.storage.save("grades", (grade.to_dict() for grade in data), changed, removed)
+        self.interval_index = None
+        self.version += 1
         self.reload_grades()
-
-    def reload_grades(self):
-        """Reloads grade objs"""
-        self.grades = self.load_grades()
-        self.grade_dict = {grade.grade_id: grade for grade in self.grades}
-
-    def display_grades(self):
-        """Display grade objs"""
-        print("*********Grade Catalog**************")
-        for grade in self.grades:
-            print(grade)
-        print("*******************************")
+        if self.auto_regrade:
+            self.regrade()
+
+    def reload_grades(self, force=False):
+        """Reloads grade objs when another process changed the stored table"""
+        if not force and not self.storage.is_stale("grades"):
+            return
+        self.grade_dict = {grade.grade_id: grade for grade in self.load_grades()}
+        self.page_index = None
+        self.interval_index = None
+        self.version += 1
+
+    def grade_for_marks(self, marks):
+        """Returns the letter grade for marks from the catalog ranges, None when none matches"""
+        if self.interval_index is None:
+            self.interval_index = GradeIntervalIndex(self.grade_dict.values())
+        return self.interval_index.grade_for_marks(marks)
+
+    def regrade(self, course_ids=None, students=None):
+        """Re-derives letter grades of some or all courses, returns the number of students changed"""
+        return (students or student_management).update_letter_grades(self.grade_for_marks, course_ids)
+
+    def list_grades(self, page_size=display_page_size, offset=0, after=None):
+        """Returns (grade objs, cursor) of one page ordered by grade id."""
+        if self.page_index is None:
+            self.page_index = PageIndex(self.grade_dict)
+        keys, cursor = self.page_index.page(page_size, offset, after)
+        return [self.grade_dict[key] for key in keys], cursor
+
+    def display_grades(self, page_size=display_page_size, offset=0, after=None):
+        """Displays one page of grade objs, returns the cursor of the next page."""
+        grades, cursor = self.list_grades(page_size, offset, after)
+        render_table("Grade Catalog", [grade.to_dict() for grade in grades], table_fields["grades"])
+        return cursor
 
     def add_grade(self, grade):
         """Adds grade to list, dict and csv"""
         self.grade_dict[grade.grade_id] = grade
-        self.save_grades(self.grade_dict.values())
+        self.save_grades(self.grade_dict.values(), changed=[grade])
 
     def delete_grade(self, grade_id):
         """Deletes grade from list, dict and csv"""
         self.grade_dict.pop(grade_id)
-        self.save_grades(self.grade_dict.values())
+        self.save_grades(self.grade_dict.values(), removed=[grade_id])
 
     def update_grade(self, grade):
         """Updates grade in list, dict and csv"""
         self.grade_dict[grade.grade_id] = grade
-        self.save_grades(self.grade_dict.values())
+        self.save_grades(self.grade_dict.values(), changed=[grade])
+
+grade_management = LazyManager(functools.partial(GradeManagement, auto_regrade=True))
+
+
+class TranscriptEngine:
+    """Credit-weighted transcripts and GPAs joined from the student, course and grade managers.
+
+    Transcripts are cached per student with the enrollments, course credits
+    and grade catalog version they were built from, and rebuilt only when
+    one of those changed. Grade letters count towards the GPA when they are
+    in the catalog and in grade_points. The class ranking is kept until the
+    student, course or grade manager's version moves, so class_rank is a
+    lookup rather than a pass over the roster.
+    """
+
+    def __init__(self, students=None, courses=None, grades=None):
+        """Initialize the engine over the given or shared managers"""
+        self.students = students or student_management
+        self.courses = courses or course_management
+        self.grades = grades or grade_management
+        self.cache = {}
+        self.rankings = None
+        self.rank_keys = []
+        self.rank_versions = None
+
+    def cache_key(self, student):
+        """Returns what a student's transcript depends on."""
+        enrollments = tuple((course_id, enrollment.grade, enrollment.marks) for course_id, enrollment in student.enrollments.items())
+        course_dict = self.courses.course_dict
+        credits = tuple(course_dict[course_id].credits if course_id in course_dict else None for course_id in student.enrollments)
+        return enrollments, credits, self.grades.version
+
+    def build(self, student):
+        """Builds a student's transcript lines and cumulative GPA."""
+        letters = {grade.grade for grade in self.grades.grade_dict.values()}
+        course_dict = self.courses.course_dict
+        lines = []
+        for course_id, enrollment in student.enrollments.items():
+            if not course_id:
+                continue
+            course = course_dict.get(course_id)
+            points = grade_points.get(enrollment.grade) if enrollment.grade in letters else None
+            lines.append({
+                "course_id": course_id,
+                "course_name": course.course_name if course else "",
+                "credits": parse_marks(course.credits) if course else None,
+                "grade": enrollment.grade,
+                "marks": enrollment.marks,
+                "points": points,
+            })
+        return {"email_address": student.email_address, "courses": lines, **self.weigh(lines)}
+
+    def weigh(self, lines):
+        """Returns the graded credits and credit-weighted GPA of transcript lines."""
+        credits = 0
+        weighted_points = 0
+        for line in lines:
+            if line["points"] is not None and line["credits"]:
+                credits += line["credits"]
+                weighted_points += line["points"] * line["credits"]
+        return {"credits": credits, "gpa": weighted_points / credits if credits else None}
+
+    def transcript(self, email_address):
+        """Returns a student's transcript, from the cache when nothing it depends on changed."""
+        student = self.students.get_student(email_address)
+        key = self.cache_key(student)
+        cached = self.cache.get(email_address)
+        if cached is None or cached[0] != key:
+            cached = (key, self.build(student))
+            self.cache[email_address] = cached
+            self.rankings = None
+        return cached[1]
+
+    def gpa(self, email_address, course_ids=None):
+        """Returns the cumulative GPA, or the term GPA over course_ids, None without graded credits."""
+        transcript = self.transcript(email_address)
+        if course_ids is None:
+            return transcript["gpa"]
+        course_ids = set(course_ids)
+        return self.weigh([line for line in transcript["courses"] if line["course_id"] in course_ids])["gpa"]
+
+    def ranked(self):
+        """Returns [(gpa, email)] of every student with a GPA, highest first."""
+        versions = (self.students.version, self.courses.version, self.grades.version)
+        if self.rankings is not None and versions == self.rank_versions:
+            return self.rankings
+        students = self.students.student_dict
+        for email_address in students:
+            self.transcript(email_address)
+        if len(self.cache) != len(students):
+            self.cache = {email_address: self.cache[email_address] for email_address in students}
+        self.rankings = sorted(((cached[1]["gpa"], email_address) for email_address, cached in self.cache.items() if cached[1]["gpa"] is not None), key=lambda entry: (-entry[0], entry[1]))
+        self.rank_keys = [-gpa for gpa, _ in self.rankings]
+        self.rank_versions = versions
+        return self.rankings
+
+    def class_rank(self, email_address):
+        """Returns (rank, class size) by cumulative GPA, equal GPAs share a rank, None without a GPA."""
+        gpa = self.gpa(email_address)
+        if gpa is None:
+            return None
+        rankings = self.ranked()
+        return bisect.bisect_left(self.rank_keys, -gpa) + 1, len(rankings)
+
+    def deans_list(self, min_gpa=3.5, min_credits=0):
+        """Returns [(email, gpa)] of students at or above min_gpa with enough graded credits."""
+        return [(email_address, gpa) for gpa, email_address in self.ranked()
+                if gpa >= min_gpa and self.cache[email_address][1]["credits"] >= min_credits]
+
+
+transcript_engine = LazyManager(TranscriptEngine)
+
+
+def render_course_report(course, rows):
+    """Renders one course report from its catalog row and (email, name, grade, marks) rows.
+
+    Runs in report worker processes, so it only uses its arguments.
+    """
+    stats = CourseMarkStats()
+    for _, _, _, marks in rows:
+        if marks is not None:
+            stats.add(marks)
+    records = [{"email_address": email_address, "name": name, "grade": grade, "marks": "" if marks is None else str(marks)} for email_address, name, grade, marks in rows]
+    fields = ["email_address", "name", "grade", "marks"]
+    out = io.StringIO()
+    out.write(f"Course: {course['course_id']} {course['course_name']}, Credits: {course['credits']}\n")
+    out.write("********Displaying Course Report********\n")
+    for record in records:
+        out.write(f"Student Email: {record['email_address']} Name: {record['name']}, Grade: {record['grade']}, Marks: {record['marks']}\n")
+    out.write("******************************************\n\n")
+    out.write("************Course Stats*****************\n")
+    out.write(f"{stats.summary()}\n")
+    out.write("******************************************\n\n")
+    render_table("Students Sorted By Grades", sorted(records, key=lambda record: (record["grade"], record["email_address"])), fields, out)
+    render_table("Students Sorted By Email", sorted(records, key=lambda record: record["email_address"]), fields, out)
+    marked = [(marks, record) for (_, _, _, marks), record in zip(rows, records) if marks is not None]
+    marked.sort(key=lambda entry: (-entry[0], entry[1]["email_address"]))
+    render_table("Students Sorted By Marks", [record for _, record in marked], fields, out)
+    return out.getvalue()
+
+
+class ReportGenerator:
+    """Writes every course report, and each professor's reports, to files.
+
+    The enrollments are joined once through the course index, then the
+    courses are rendered by render_course_report in a process pool, or
+    in this process with workers=1. Both give the same files.
+    """
+
+    def __init__(self, students=None, courses=None, professors=None):
+        """Initialize the generator over the given or shared managers"""
+        self.students = students or student_management
+        self.courses = courses or course_management
+        self.professors = professors or professor_management
+
+    def course_rows(self):
+        """Returns (course dict, rows) per catalog course from one pass over the course index."""
+        course_index = self.students.get_course_index()
+        student_dict = self.students.student_dict
+        jobs = []
+        for course in self.courses.courses:
+            rows = []
+            for email_address, (grade, marks) in course_index.enrollments(course.course_id).items():
+                student = student_dict[email_address]
+                rows.append((email_address, f"{student.first_name} {student.last_name}", grade, marks))
+            jobs.append((course.to_dict(), rows))
+        return jobs
+
+    def generate(self, directory, workers=None, progress=None):
+        """Writes course_<id>.txt and professor_<email>.txt files, returns counts and wall time.
+
+        progress(done, total) is called after each course is rendered.
+        """
+        start = time.perf_counter()
+        os.makedirs(directory, exist_ok=True)
+        jobs = self.course_rows()
+        workers = workers or os.cpu_count() or 1
+        reports = {}
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                rendered = pool.map(render_course_report, [course for course, _ in jobs], [rows for _, rows in jobs])
+                for (course, _), report in zip(jobs, rendered):
+                    reports[course["course_id"]] = report
+                    if progress:
+                        progress(len(reports), len(jobs))
+        else:
+            for course, rows in jobs:
+                reports[course["course_id"]] = render_course_report(course, rows)
+                if progress:
+                    progress(len(reports), len(jobs))
+        for course_id, report in reports.items():
+            with open(os.path.join(directory, f"course_{course_id}.txt"), 'w', encoding='utf-8') as file:
+                file.write(report)
+        professors = self.professors.professors
+        for professor in professors:
+            with open(os.path.join(directory, f"professor_{professor.email_address}.txt"), 'w', encoding='utf-8') as file:
+                file.write(f"Professor: {professor.name} ({professor.email_address}), {professor.rank}\n\n")
+                for course_id in professor.course_list():
+                    if course_id in reports:
+                        file.write(reports[course_id] + "\n")
+        return {"courses": len(reports), "professors": len(professors), "seconds": time.perf_counter() - start}
+
+
+def read_import_records(path):
+    """Yields import records one at a time from a .jsonl or csv file."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+class BulkImport:
+    """Streams student and enrollment records into student storage in batches.
+
+    Records with a course_id set one enrollment (grade and marks) of an
+    existing or earlier imported student, other records are whole student
+    rows in the student.csv format. Each batch is persisted with one save.
+    """
+
+    def __init__(self, students=None, courses=None, grades=None, batch_size=1000):
+        """Initialize the import over the given or shared managers"""
+        self.students = students or student_management
+        self.courses = courses or course_management
+        self.grades = grades or grade_management
+        self.batch_size = batch_size
+
+    def validate_enrollment(self, course_id, grade, marks):
+        """Returns why an enrollment is invalid, None when it is valid."""
+        if course_id not in self.course_ids:
+            return f"unknown course {course_id!r}"
+        if grade and grade not in self.grade_letters:
+            return f"unknown grade {grade!r}"
+        if marks not in ("", None) and parse_marks(marks) is None:
+            return f"marks {marks!r} is not a number"
+        return None
+
+    def parse_record(self, record, batch):
+        """Returns (student, None) for a valid record or (None, reason)."""
+        email_address = (record.get("email_address") or "").strip()
+        if not email_address:
+            return None, "missing email_address"
+        if record.get("course_id"):
+            reason = self.validate_enrollment(record["course_id"], record.get("grade") or "", record.get("marks"))
+            if reason:
+                return None, reason
+            student = batch.get(email_address)
+            if student is None:
+                try:
+                    existing = self.students.get_student(email_address)
+                except KeyError:
+                    return None, f"unknown student {email_address!r}"
+                # Changed on a copy, the roster is only touched when the batch is saved
+                student = Student(**existing.to_dict())
+            if record["course_id"] not in student.enrollments:
+                student.add_course(record["course_id"])
+            student.set_result(record["course_id"], record.get("grade") or "", record.get("marks"))
+            return student, None
+        if not record.get("first_name") or not record.get("last_name"):
+            return None, "missing first_name or last_name"
+        courses, grades, marks = record.get("courses") or "", record.get("grades") or "", record.get("marks") or ""
+        if courses:
+            grade_list = grades.split(",") if grades else []
+            marks_list = marks.split(",") if marks else []
+            for i, course_id in enumerate(courses.split(",")):
+                reason = self.validate_enrollment(course_id, grade_list[i] if i < len(grade_list) else "", marks_list[i] if i < len(marks_list) else "")
+                if reason:
+                    return None, reason
+        return Student(record["first_name"], record["last_name"], email_address, courses, grades, marks), None
+
+    def run(self, records):
+        """Imports records and returns a report of counts, rejected rows and rows per second.
+
+        Rejected rows are (row number, reason) pairs, row 1 is the first record.
+        """
+        start = time.perf_counter()
+        self.course_ids = set(self.courses.course_dict)
+        self.grade_letters = {grade.grade for grade in self.grades.grade_dict.values()}
+        report = {"rows": 0, "imported": 0, "rejected": [], "batches": 0}
+        batch = {}
+        rows = 0
+        for row_number, record in enumerate(records, 1):
+            report["rows"] = row_number
+            student, reason = self.parse_record(record, batch)
+            if student is None:
+                report["rejected"].append((row_number, reason))
+                continue
+            batch.pop(student.email_address, None)
+            batch[student.email_address] = student
+            rows += 1
+            if rows >= self.batch_size:
+                self.students.import_students(batch.values())
+                report["imported"] += rows
+                report["batches"] += 1
+                batch = {}
+                rows = 0
+        if batch:
+            self.students.import_students(batch.values())
+            report["imported"] += rows
+            report["batches"] += 1
+        elapsed = time.perf_counter() - start
+        report["seconds"] = elapsed
+        report["rows_per_second"] = report["rows"] / elapsed if elapsed else 0
+        return report
+
+    def import_file(self, path):
+        """Imports a csv or .jsonl file."""
+        return self.run(read_import_records(path))
+
+
+class GradeServer:
+    """Serves JSON-lines requests from many clients over one shared set of managers.
+
+    Student data is read on the event loop, saves run on a single writer
+    thread. The managers' own locks keep them consistent, and let reads
+    through while a save is writing to disk.
+    """
+
+    def __init__(self, students=None, users=None):
+        """Initialize the server over the given or shared managers"""
+        self.students = students or student_management
+        self.users = users or user_management
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.requests = 0
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """Starts listening and returns the asyncio server."""
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def handle_client(self, reader, writer):
+        """Answers one request per line until the client disconnects."""
+        session = {"user_id": None, "role": None}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = {"ok": True, "result": await self.dispatch(session, json.loads(line))}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e) or type(e).__name__}
+                self.requests += 1
+                writer.write(json.dumps(response).encode('utf-8') + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, session, request):
+        """Runs one request for a session."""
+        op = request.get("op")
+        if op == "login":
+            if not self.users.login(request["user_id"], request["password"], request["role"]):
+                raise PermissionError("invalid credentials")
+            session["user_id"], session["role"] = request["user_id"], request["role"]
+            return True
+        if session["user_id"] is None:
+            raise PermissionError("login required")
+        if op == "student":
+            email_address = session["user_id"] if session["role"] == "student" else request["email_address"]
+            return self.students.get_student(email_address).to_dict()
+        if session["role"] != "professor":
+            raise PermissionError("professor login required")
+        if op == "search":
+            return [student.to_dict() for student in self.students.get_students(request["key"])]
+        if op == "course_report":
+            _, student_dict = self.students.course_students(request["course_id"])
+            return {"students": student_dict, "stats": self.students.course_stats(request["course_id"])}
+        if op == "add_grade":
+            student = self.students.get_student(request["email_address"])
+            if request["course_id"] not in student.enrollments:
+                raise KeyError(f"student not part of course {request['course_id']}")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.students.add_grade, student, request["course_id"], request["grade"], request["marks"])
+            return True
+        raise ValueError(f"unknown op {op}")
+
+
+def serve(host="127.0.0.1", port=8765, unix_path=None):
+    """Runs the grade server until interrupted."""
+    async def run():
+        server = await GradeServer().start(host, port, unix_path)
+        print(f"Serving on {unix_path or f'{host}:{port}'}")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+async def load_test(host, port, user_id, password, role, clients=10, requests=100, ops=None, unix_path=None):
+    """Runs clients concurrent sessions of requests each and returns requests per second."""
+    ops = ops or [{"op": "student", "email_address": user_id}]
+
+    async def client():
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        writer.write(json.dumps({"op": "login", "user_id": user_id, "password": password, "role": role}).encode('utf-8') + b"\n")
+        await writer.drain()
+        if not json.loads(await reader.readline())["ok"]:
+            raise PermissionError("load test login failed")
+        for i in range(requests):
+            writer.write(json.dumps(ops[i % len(ops)]).encode('utf-8') + b"\n")
+            await writer.drain()
+            await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return clients * requests / elapsed
 
-grade_management = GradeManagement()
 
 def main():
     while True:
@@ -647,6 +3238,7 @@ def main():
                     "5 (check my marks) \n"
                     "6 (to delete your account) \n"
                     "7 (to reset password) \n"
+                    "8 (view my transcript) \n"
                     "10 (to log out) \n"
                     ))
                     if student_input == "1":
@@ -681,7 +3273,6 @@ def main():
                          registration = input("Are you sure to delete your account, enter yes for confirmation: ")
                          if registration == "yes":
                             student_management.delete_student(user_id)
-                            user_management.delete_user(user_id)
                             print("********Succesfully deleted student account********")
                             break
                     elif student_input == "7":
@@ -689,6 +3280,17 @@ def main():
                         user_management.change_password(user_id, password)
                         print("Password reset successful")
                         break
+                    elif student_input == "8":
+                        print("*********Displaying Transcript**************")
+                        transcript = transcript_engine.transcript(user_id)
+                        for line in transcript["courses"]:
+                            print(f"Course: {line['course_id']} {line['course_name']}, Credits: {line['credits']}, Grade: {line['grade']}, Marks: {'' if line['marks'] is None else line['marks']}")
+                        gpa = transcript["gpa"]
+                        print(f"Credits: {transcript['credits']}, GPA: {'' if gpa is None else f'{gpa:.2f}'}")
+                        rank = transcript_engine.class_rank(user_id)
+                        if rank is not None:
+                            print(f"Class rank: {rank[0]} of {rank[1]}")
+                        print("********************************************")
                     elif student_input == "10":
                         break
                     else:
@@ -745,6 +3347,7 @@ def main():
                             "2 (to modify existing course) \n"
                             "3 (to delete a course) \n"
                             "4 (to self assign course) \n"
+                            "5 (to rename a course) \n"
                             "10 (to exit courses) \n"
                             ))
                             course_management.display_courses()
@@ -792,15 +3395,35 @@ def main():
                                 except Exception as e:
                                     print(f"Error: {str(e)}")
                                     print("********Error assigning a course, please try again********")
+                            elif course_input == "5":
+                                rename_course_id = input("Enter course id to rename: ")
+                                new_course_id = input("Enter new course id: ")
+                                try:
+                                    course_management.rename_course(rename_course_id, new_course_id)
+                                    print("***********Succesfully renamed the Course**********")
+                                except (KeyError, ValueError) as e:
+                                    print(f"***********Error renaming the course, {e}**********")
                             elif course_input == "10":
                                 break
                     elif professor_input == "5":
                         print("********Displaying all students********")
-                        student_management.display_students()
+                        cursor = student_management.display_students()
+                        while cursor is not None and input("Enter n for the next page: ") == "n":
+                            cursor = student_management.display_students(after=cursor)
                     elif professor_input == "6":
-                        search_key = input("Enter key to search for students: ")
+                        search_key = input("Enter key to search for students, or a query like course:Data200 marks>=80 (prefix explain to see the plan): ")
                         start = time.time()
-                        retr_student_list = student_management.get_students(search_key)
+                        try:
+                            if search_key.startswith("explain "):
+                                search_key = search_key[len("explain "):]
+                                print(student_management.explain_query(search_key))
+                            if any(query_term.match(term) for term in search_key.split()) or " OR " in search_key:
+                                retr_student_list = student_management.query_students(search_key)
+                            else:
+                                retr_student_list = student_management.get_students(search_key)
+                        except ValueError as e:
+                            print(f"********Invalid query, {e}********")
+                            retr_student_list = []
                         end = time.time()
                         print(f"Time taken to get search results: {(end - start)*1000} ms")
                         print(f"********Search result for key: {search_key}, time elapsed: {(end - start)*1000} ms ********")
@@ -827,7 +3450,7 @@ def main():
                         print("******************************************\n")
 
                         print("************Course Stats*****************")
-                        print(student_management.course_mark_stats(student_dict))
+                        print(student_management.course_stats(selected_course_id))
                         print("******************************************\n")
 
                         while True:
@@ -837,6 +3460,8 @@ def main():
                             "3 (to sort students by grade) \n"
                             "4 (to sort students by email) \n"
                             "5 (to sort students by marks) \n"
+                            "6 (to show top students) \n"
+                            "7 (to show a student's rank) \n"
                             "10 (to exit grades) \n"
                             ))
 
@@ -844,33 +3469,51 @@ def main():
 
                             if grade_input == "1":
                                 student_email = input("Enter student email: ")
-                                student_grade_id = input("Enter student grade: ")
+                                student_grade_id = input("Enter student grade (blank to derive from marks): ")
                                 student_marks = input("Enter student marks: ")
                                 professor_management.add_student_grade(student_email, selected_course_id, student_grade_id, student_marks)
 
                             elif grade_input == "2":
                                 student_email = input("Enter student email to modify grade: ")
-                                student_grade_id = input("Enter new grade for student: ")
+                                student_grade_id = input("Enter new grade for student (blank to derive from marks): ")
                                 student_marks = input("Enter new marks for student: ")
                                 professor_management.add_student_grade(student_email, selected_course_id, student_grade_id, student_marks)
                             elif grade_input == "3":
-                                sorted_students = sorted(student_dict.values(), key=lambda x: x["grade"])
+                                sorted_students = student_management.sorted_course_students(selected_course_id, "grade")
                                 print("********Displaying Students Sorted By Grades********")
                                 for student in sorted_students:
                                     print(student)
                                 print("********************************************")
                             elif grade_input == "4":
-                                sorted_students = sorted(student_dict.values(), key=lambda x: x["email_address"])
+                                sorted_students = student_management.sorted_course_students(selected_course_id, "email")
                                 print("********Displaying Students Sorted By Email********")
                                 for student in sorted_students:
                                     print(student)
                                 print("********************************************")
                             elif grade_input == "5":
-                                sorted_students = sorted(student_dict.values(), key=lambda x: x["marks"], reverse=True)
+                                sorted_students = student_management.sorted_course_students(selected_course_id, "marks", descending=True)
                                 print("********Displaying Students Sorted By Marks********")
                                 for student in sorted_students:
                                     print(student)
+                                unmarked_students = student_management.sorted_course_students(selected_course_id, "unmarked")
+                                if unmarked_students:
+                                    print("No marks:")
+                                    for student in unmarked_students:
+                                        print(student)
+                                print("********************************************")
+                            elif grade_input == "6":
+                                top_k = input("Enter number of students: ")
+                                print("********Displaying Top Students********")
+                                for student in student_management.top_students(selected_course_id, int(top_k) if top_k.isdigit() else 10):
+                                    print(student)
                                 print("********************************************")
+                            elif grade_input == "7":
+                                student_email = input("Enter student email: ")
+                                rank = student_management.student_rank(selected_course_id, student_email)
+                                if rank is None:
+                                    print("********Student has no marks in this course********")
+                                else:
+                                    print(f"Rank {rank[0]}, percentile {rank[1]:.1f}")
                             elif grade_input == "10":
                                 break
                             else:
@@ -926,7 +3569,6 @@ def main():
                         registration = input("Are you sure to delete your account, enter yes for confirmation: ")
                         if registration == "yes":
                             professor_management.delete_professor(user_id)
-                            user_management.delete_user(user_id)
                             print("********Succesfully deleted professor account********")
                             break
 
@@ -961,5 +3603,66 @@ def main():
         else:
             print("********Invalid user type********")
 
+def parse_args(argv=None):
+    """Parses the command line, no command runs the interactive menu."""
+    parser = argparse.ArgumentParser(description="Check My Grade Application")
+    commands = parser.add_subparsers(dest="command")
+    migrate = commands.add_parser("migrate", help="import the csv files into sqlite")
+    migrate.add_argument("db", nargs="?", default=None)
+    server = commands.add_parser("serve", help="serve JSON-lines requests over TCP or a Unix socket")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8765)
+    server.add_argument("--unix", default=None, help="Unix socket path instead of TCP")
+    reporter = commands.add_parser("reports", help="write every course and professor report to a directory")
+    reporter.add_argument("directory")
+    reporter.add_argument("--workers", type=int, default=None, help="report processes, 1 renders in this process")
+    resharder = commands.add_parser("reshard", help="split student storage into hash-keyed shard files")
+    resharder.add_argument("shards", type=int)
+    importer = commands.add_parser("import", help="bulk import student or enrollment records from csv or jsonl")
+    importer.add_argument("path")
+    importer.add_argument("--batch-size", type=int, default=1000)
+    tester = commands.add_parser("loadtest", help="measure requests per second against a running server")
+    tester.add_argument("user_id")
+    tester.add_argument("password")
+    tester.add_argument("role", choices=["student", "professor"])
+    tester.add_argument("--host", default="127.0.0.1")
+    tester.add_argument("--port", type=int, default=8765)
+    tester.add_argument("--unix", default=None)
+    tester.add_argument("--clients", type=int, default=10)
+    tester.add_argument("--requests", type=int, default=100)
+    tester.add_argument("--search", default=None, help="professor search key to mix into the requests")
+    tester.add_argument("--course", default=None, help="professor course report to mix into the requests")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.command == "migrate":
+        migrate_csv_to_sqlite(args.db)
+    elif args.command == "serve":
+        serve(args.host, args.port, args.unix)
+    elif args.command == "reports":
+        report = ReportGenerator().generate(args.directory, args.workers, lambda done, total: print(f"\rRendered {done}/{total} course reports", end="", flush=True))
+        print(f"\nWrote {report['courses']} course and {report['professors']} professor reports in {report['seconds']:.2f} s")
+    elif args.command == "reshard":
+        rows = CsvStorage().reshard("students", args.shards)
+        print(f"Moved {rows} students to {args.shards} shards")
+    elif args.command == "import":
+        report = BulkImport(batch_size=args.batch_size).import_file(args.path)
+        for row_number, reason in report["rejected"]:
+            print(f"Rejected row {row_number}: {reason}")
+        print(f"Imported {report['imported']} of {report['rows']} rows in {report['batches']} batches, {report['rows_per_second']:.1f} rows/s")
+    elif args.command == "loadtest":
+        ops = [{"op": "student", "email_address": args.user_id}]
+        if args.search:
+            ops.append({"op": "search", "key": args.search})
+        if args.course:
+            ops.append({"op": "course_report", "course_id": args.course})
+        rps = asyncio.run(load_test(args.host, args.port, args.user_id, args.password, args.role, args.clients, args.requests, ops, args.unix))
+        print(f"{args.clients * args.requests} requests from {args.clients} clients: {rps:.1f} requests/s")
+    else:
+        try:
+            main()
+        finally:
+            if metrics.enabled:
+                metrics.dump(metrics_file)
@@ -1,7 +1,18 @@
 import unittest
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+import statistics
+import subprocess
+import sys
+import threading
 import time
 from datetime import datetime
 from random import randint
+import benchmark_check_my_grade
+import check_my_grade
 from check_my_grade import Student, StudentManagement, Course, CourseManagement, Professor, ProfessorManagement, Grade, GradeManagement, User, UserManagement
 
 class TestCheckMyGrade(unittest.TestCase):
@@ -15,6 +26,19 @@ class TestCheckMyGrade(unittest.TestCase):
         cls.grade_management = GradeManagement()
         cls.user_management = UserManagement()
 
+    @contextlib.contextmanager
+    def temp_paths(self, *names):
+        """Points the named check_my_grade file paths into a fresh temp directory, restored on exit."""
+        saved = {name: getattr(check_my_grade, name) for name in names}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, path in saved.items():
+                setattr(check_my_grade, name, os.path.join(tmp_dir, os.path.basename(path)))
+            try:
+                yield tmp_dir
+            finally:
+                for name, path in saved.items():
+                    setattr(check_my_grade, name, path)
+
     def test_add_delete_modify_student(self):
         """Test adding, modifying, and deleting students."""
         email_prefix = "test_student"
@@ -50,6 +74,94 @@ class TestCheckMyGrade(unittest.TestCase):
         time_elapsed = (end_time - start_time).total_seconds() * 1000
         print(f"For 1000 records, search execution time: {time_elapsed} ms")
 
+    def test_student_enrollments(self):
+        """Test parsed enrollments round-trip through the csv columns."""
+        student = Student("Typed", "Student", "typed@school.com", "Data200,Data201,Data230", "A,,B+", "95,,89")
+        self.assertEqual(student.enrollments["Data200"].marks, 95)
+        self.assertIsNone(student.enrollments["Data201"].marks)
+        self.assertEqual(student.to_dict()["grades"], "A,,B+")
+
+        student.set_result("Data201", "A-", "83")
+        self.assertEqual(student.course_dict()["Data201"], {"grade": "A-", "marks": "83"})
+        self.assertEqual(student.marks, "95,83,89")
+        with self.assertRaises(ValueError):
+            student.set_result("Data201", "A-", "eighty")
+
+        # Rows with marks but no course keep their marks
+        self.assertEqual(Student("Sort", "Only", "sort_only@school.com", marks="77").marks, "77")
+
+        # Marks that are not plain integers are written back as stored
+        student = Student("Raw", "Marks", "raw_marks@school.com", "Data200,Data201,Data230", "A,B,C", "85.5,90,abc")
+        self.assertIsNone(student.enrollments["Data200"].marks)
+        self.assertEqual(student.enrollments["Data201"].marks, 90)
+        self.assertEqual(student.to_dict()["marks"], "85.5,90,abc")
+        student.set_result("Data201", "A", "91")
+        self.assertEqual(student.marks, "85.5,91,abc")
+        course_dict = student.course_dict()
+        course_dict["Data201"]["marks"] = "92"
+        student.course_dict_to_string(course_dict)
+        self.assertEqual(student.marks, "85.5,92,abc")
+        with self.assertRaises(ValueError):
+            student.set_result("Data200", "A", "86.5")
+        self.assertEqual(Student("Raw", "Marks", "raw@school.com", "Data200", "A", " 85").marks, " 85")
+
+    def test_search_index_matches_scan(self):
+        """Test the trigram index returns the same students as the linear scan, in roster order."""
+        student = Student("Indexed", "Searchable", "indexed_search@school.com", "Data200", "A", "91")
+        self.student_management.add_new_student(student)
+        for search_key in ["harika", "ganna", "Data20", "gmail.com", "Searchable", "A-", "9", "", "no such key"]:
+            indexed = self.student_management.get_students(search_key, use_index=True)
+            scanned = self.student_management.get_students(search_key, use_index=False)
+            self.assertEqual([s.email_address for s in indexed], [s.email_address for s in scanned])
+
+        # A student deleted and added again moves to the end of the roster, and of the results
+        self.student_management.add_new_student(Student("Indexed", "Searchable", "indexed_again@school.com"))
+        self.student_management.delete_student("indexed_search@school.com")
+        self.student_management.add_new_student(student)
+        self.assertEqual([s.email_address for s in self.student_management.get_students("Searchable")], ["indexed_again@school.com", "indexed_search@school.com"])
+
+        # An update moves the student to the end of the roster too
+        self.student_management.update_student(self.student_management.get_student("indexed_again@school.com"))
+        self.assertEqual([s.email_address for s in self.student_management.get_students("Searchable")], ["indexed_search@school.com", "indexed_again@school.com"])
+        self.assertEqual(self.student_management.get_students("Searchable"), self.student_management.get_students("Searchable", use_index=False))
+
+        self.student_management.delete_student("indexed_search@school.com")
+        self.student_management.delete_student("indexed_again@school.com")
+        self.assertEqual(self.student_management.get_students("Searchable"), [])
+
+    def test_course_students_index(self):
+        """Test the course enrollment index follows course and grade changes."""
+        student = Student("Course", "Indexed", "course_index@school.com")
+        self.student_management.add_new_student(student)
+        self.student_management.get_course_index()
+        student = self.student_management.get_student("course_index@school.com")
+        self.student_management.assign_course(student, "Data230")
+        self.student_management.add_grade(student, "Data230", "A", "93")
+
+        _, student_dict = self.student_management.course_students("Data230")
+        self.assertEqual(student_dict["course_index@school.com"]["marks"], "93")
+        expected = {s.email_address for s in self.student_management.students if "Data230" in s.course_dict()}
+        self.assertEqual(set(student_dict), expected)
+
+        self.student_management.delete_student("course_index@school.com")
+        _, student_dict = self.student_management.course_students("Data230")
+        self.assertNotIn("course_index@school.com", student_dict)
+
+    def test_course_stats(self):
+        """Test running course statistics agree with a full recomputation."""
+        _, student_dict = self.student_management.course_students("Data200")
+        marks_list = [int(student["marks"]) for student in student_dict.values() if student["marks"]]
+        stats = self.student_management.course_stats("Data200")
+        self.assertEqual(stats["min"], min(marks_list))
+        self.assertEqual(stats["max"], max(marks_list))
+        self.assertEqual(stats["median"], statistics.median(marks_list))
+        self.assertAlmostEqual(stats["stddev"], statistics.pstdev(marks_list))
+        self.assertEqual(self.student_management.course_mark_stats(student_dict)["avg"], stats["avg"])
+
+        # Empty and ungraded courses report zeros instead of failing
+        self.assertEqual(self.student_management.course_stats("NoSuchCourse")["median"], 0)
+        self.assertEqual(self.student_management.course_mark_stats({"x@school.com": {"marks": ""}})["max"], 0)
+
     def test_sort_students(self):
         """Test sorting students by marks and email, and measure execution time."""
         # Add some test students
@@ -69,6 +181,685 @@ class TestCheckMyGrade(unittest.TestCase):
         end_time = time.time()
         print(f"For 1000 records, sorting by email took: {(end_time - start_time) * 1000} ms")
 
+    def test_journaled_students(self):
+        """Test journaled student mutations are replayed and compacted without losing other managers' records."""
+        with self.temp_paths("students_csv", "students_journal"):
+            student_management = StudentManagement(journal=True)
+            for i in range(10):
+                student_management.add_new_student(Student(f"First{i}", f"Last{i}", f"journal{i}@school.com"))
+            student = student_management.get_student("journal0@school.com")
+            student.update_first_name("UpdatedFirst")
+            student_management.update_student(student)
+            student_management.delete_student("journal9@school.com")
+            self.assertFalse(os.path.exists(check_my_grade.students_csv))
+
+            # Replayed on load
+            replayed = StudentManagement(journal=True)
+            self.assertEqual(len(replayed.students), 9)
+            self.assertEqual(replayed.get_student("journal0@school.com").first_name, "UpdatedFirst")
+
+            # Compacted into the csv snapshot
+            replayed.compact_journal()
+            self.assertFalse(os.path.exists(check_my_grade.students_journal))
+            self.assertEqual(len(StudentManagement().students), 9)
+
+            # Compacting keeps records another manager appended after this one replayed
+            first, second = StudentManagement(journal=True), StudentManagement(journal=True)
+            first.add_new_student(Student("From", "First", "from_first@school.com"))
+            second.add_new_student(Student("From", "Second", "from_second@school.com"))
+            first.compact_journal()
+            self.assertFalse(os.path.exists(check_my_grade.students_journal))
+            self.assertTrue({"from_first@school.com", "from_second@school.com"} <= set(StudentManagement().student_dict))
+
+            # A plain manager replays the journal on load and folds it in with its next save
+            second.add_new_student(Student("From", "Second", "from_second_again@school.com"))
+            plain = StudentManagement()
+            plain.save_students(plain.students)
+            self.assertIn("from_second_again@school.com", StudentManagement().student_dict)
+            second.compact_journal()
+            self.assertFalse(os.path.exists(check_my_grade.students_journal))
+            self.assertEqual(len(StudentManagement().students), 12)
+
+    def test_sqlite_storage(self):
+        """Test migrating the csvs to sqlite and updating single rows."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "check_my_grade.db")
+            check_my_grade.migrate_csv_to_sqlite(db_path)
+            storage = check_my_grade.SqliteStorage(db_path)
+            try:
+                student_management = StudentManagement(storage=storage)
+                self.assertEqual(len(student_management.students), len(self.student_management.students))
+
+                student = Student("Sqlite", "Student", "sqlite@school.com", "Data202", "A", "94")
+                student_management.add_new_student(student)
+                self.assertEqual(storage.get("students", "sqlite@school.com")["marks"], "94")
+                self.assertIn(("sqlite@school.com", "A", 94), storage.course_enrollments("Data202"))
+
+                # Lookups and course rosters are served by queries without loading the roster
+                lazy = StudentManagement(storage=storage, offset_index=True)
+                self.assertEqual(lazy.get_student("sqlite@school.com").to_dict(), student.to_dict())
+                self.assertEqual(lazy.course_students("Data202"), student_management.course_students("Data202"))
+                self.assertEqual(lazy.course_stats("Data202"), student_management.course_stats("Data202"))
+                self.assertNotIn("student_dict", vars(lazy))
+                with self.assertRaises(KeyError):
+                    lazy.get_student("missing@school.com")
+
+                student_management.delete_student("sqlite@school.com")
+                self.assertIsNone(storage.get("students", "sqlite@school.com"))
+                self.assertNotIn("sqlite@school.com", [row[0] for row in storage.course_enrollments("Data202")])
+
+                course_management = CourseManagement(storage=storage)
+                self.assertEqual(set(course_management.course_dict), set(self.course_management.course_dict))
+
+                # Staleness is per table, saves through another connection only mark the table they wrote
+                other = check_my_grade.SqliteStorage(db_path)
+                try:
+                    self.assertFalse(storage.is_stale("students"))
+                    UserManagement(storage=other).add_user(User("stale@school.com", "secret", "student"))
+                    self.assertTrue(storage.is_stale("users"))
+                    self.assertFalse(storage.is_stale("students"))
+                    StudentManagement(storage=other).add_new_student(Student("Other", "Connection", "other@school.com"))
+                    self.assertTrue(storage.is_stale("students"))
+                    student_management.reload_students()
+                    self.assertIn("other@school.com", student_management.student_dict)
+                    self.assertFalse(storage.is_stale("students"))
+                finally:
+                    other.close()
+            finally:
+                storage.close()
+
+    def test_lazy_import(self):
+        """Test importing the module loads and writes nothing, within the startup budget."""
+        import_budget_seconds = 1.0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "student.csv"), "w") as file:
+                file.write("first_name,last_name,email_address,courses,grades,marks\n")
+                for i in range(100000):
+                    file.write(f"First{i},Last{i},lazy{i}@school.com,Data200,A,{i % 100}\n")
+            with open(os.path.join(tmp_dir, "grades.csv"), "w") as file:
+                file.write("grade_id,grade,marks_range\n1,A,100 to 90\n")
+            grades_mtime = os.stat(os.path.join(tmp_dir, "grades.csv")).st_mtime_ns
+
+            module_dir = os.path.dirname(os.path.abspath(check_my_grade.__file__))
+            script = (
+                "import sys, time; start = time.perf_counter(); import check_my_grade; "
+                "print(time.perf_counter() - start); "
+                "print(check_my_grade.student_management.instance is None); "
+                "print(len(check_my_grade.student_management.students))"
+            )
+            result = subprocess.run([sys.executable, "-c", script], cwd=tmp_dir, capture_output=True, text=True,
+                                    env={**os.environ, "PYTHONPATH": module_dir}, check=True)
+            import_seconds, not_loaded, student_count = result.stdout.split()
+            print(f"For 100000 records, import took: {float(import_seconds) * 1000} ms")
+            self.assertLess(float(import_seconds), import_budget_seconds)
+            self.assertEqual(not_loaded, "True")
+            self.assertEqual(student_count, "100000")
+            self.assertEqual(os.stat(os.path.join(tmp_dir, "grades.csv")).st_mtime_ns, grades_mtime)
+
+    def test_offset_index_get_student(self):
+        """Test get_student reads single rows through the offset index, also while the csv is rewritten."""
+        with self.temp_paths("students_csv", "students_offset_index"):
+            writer = StudentManagement()
+            writer.save_students([Student(f"First{i}", f"Last{i}", f"offset{i}@school.com", "Data200,Data201", "A,B", f"9{i},8{i}") for i in range(10)])
+
+            reader = StudentManagement(offset_index=True)
+            student = reader.get_student("offset7@school.com")
+            self.assertEqual(student.course_dict()["Data201"], {"grade": "B", "marks": "87"})
+            self.assertNotIn("student_dict", vars(reader))
+            self.assertTrue(os.path.exists(check_my_grade.students_offset_index))
+            with self.assertRaises(KeyError):
+                reader.get_student("missing@school.com")
+
+            # A rewritten csv is detected and re-indexed
+            student = writer.get_student("offset7@school.com")
+            student.update_first_name("Changed")
+            writer.update_student(student)
+            self.assertEqual(StudentManagement(offset_index=True).get_student("offset7@school.com").first_name, "Changed")
+            self.assertEqual(reader.get_student("offset7@school.com").first_name, "Changed")
+
+            # Readers sharing the index while the csv is rewritten only see whole generations
+            errors = []
+            done = threading.Event()
+
+            def read_students():
+                while not done.is_set():
+                    for i in range(10):
+                        try:
+                            reader.get_student(f"offset{i}@school.com")
+                        except Exception as e:
+                            errors.append(e)
+            threads = [threading.Thread(target=read_students) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for i in range(40):
+                student = writer.get_student(f"offset{i % 10}@school.com")
+                student.update_first_name(f"Changed{i}")
+                writer.update_student(student)
+            done.set()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+
+            # A torn offsets file is rebuilt instead of failing the lookup
+            with open(check_my_grade.students_offset_index, 'w') as file:
+                file.write('{"signature": [1,')
+            self.assertEqual(StudentManagement(offset_index=True).get_student("offset9@school.com").first_name, "Changed39")
+
+            # Any other access loads the full roster
+            self.assertEqual(len(reader.students), 10)
+
+    def test_course_orders_and_rank(self):
+        """Test sorted course pages, top-k and rank follow numeric marks and grade changes, unmarked students kept apart."""
+        with self.temp_paths("students_csv"):
+            student_management = StudentManagement()
+            marks = [100, 65, 9, 88, 65]
+            student_management.save_students([Student("Rank", f"Student{i}", f"rank{i}@school.com", "Data200", "B", str(mark)) for i, mark in enumerate(marks)])
+            student_management.add_new_student(Student("Rank", "Unmarked", "rank5@school.com", "Data200", "", ""))
+
+            top = student_management.top_students("Data200", 2)
+            self.assertEqual([row["marks"] for row in top], ["100", "88"])
+            self.assertEqual([row["marks"] for row in student_management.bottom_students("Data200", 1)], ["9"])
+            self.assertEqual([row["email_address"] for row in student_management.sorted_course_students("Data200", "email", offset=4, limit=5)], ["rank4@school.com", "rank5@school.com"])
+            self.assertEqual(student_management.student_rank("Data200", "rank1@school.com"), (3, 60.0))
+            self.assertIsNone(student_management.student_rank("Data200", "rank5@school.com"))
+            self.assertEqual(len(student_management.sorted_course_students("Data200", "marks")), 5)
+            self.assertEqual([row["email_address"] for row in student_management.sorted_course_students("Data200", "unmarked")], ["rank5@school.com"])
+
+            student_management.add_grade(student_management.get_student("rank2@school.com"), "Data200", "A", "101")
+            self.assertEqual(student_management.top_students("Data200", 1)[0]["email_address"], "rank2@school.com")
+            self.assertEqual(student_management.sorted_course_students("Data200", "grade", limit=2)[1]["email_address"], "rank2@school.com")
+            self.assertEqual(student_management.student_rank("Data200", "rank0@school.com"), (2, 80.0))
+
+            # Once marked a student moves from the unmarked to the marks order
+            student_management.add_grade(student_management.get_student("rank5@school.com"), "Data200", "C", "50")
+            self.assertEqual(student_management.sorted_course_students("Data200", "unmarked"), [])
+            self.assertEqual(student_management.bottom_students("Data200", 1)[0]["email_address"], "rank5@school.com")
+
+    def test_grade_intervals_and_regrade(self):
+        """Test mapping marks to letter grades through the catalog ranges and bulk re-grading."""
+        index = check_my_grade.GradeIntervalIndex([Grade("1", "A", "100 to 90"), Grade("2", "A-", "91 to 80"), Grade("4", "B", " 70 to 61"), Grade("7", "F", "0-40"), Grade("8", "?", "unknown")])
+        self.assertEqual([index.grade_for_marks(marks) for marks in (100, 91, 90, 89, 80, 75, 61, 40, 0, 101)], ["A", "A", "A", "A-", "A-", None, "B", "F", "F", None])
+
+        with self.temp_paths("students_csv"):
+            student_management = StudentManagement()
+            student_management.save_students([
+                Student("Regrade", "One", "regrade1@school.com", "Data200,Data201", "C,C", "95,65"),
+                Student("Regrade", "Two", "regrade2@school.com", "Data200", "A", "92"),
+                Student("Regrade", "Three", "regrade3@school.com", "Data200", "C", ""),
+            ])
+            grade_management = GradeManagement()
+            self.assertEqual(grade_management.regrade(["Data200"], student_management), 1)
+            self.assertEqual(StudentManagement().get_student("regrade1@school.com").grades, "A,C")
+            self.assertEqual(grade_management.regrade(students=student_management), 1)
+            self.assertEqual(StudentManagement().get_student("regrade1@school.com").grades, "A,B")
+            self.assertEqual(student_management.get_student("regrade3@school.com").grades, "C")
+
+    def test_transcripts(self):
+        """Test credit-weighted GPAs, class rank and cache invalidation."""
+        with self.temp_paths("students_csv"):
+            student_management = StudentManagement()
+            student_management.save_students([
+                Student("Gpa", "One", "gpa1@school.com", "Data200,Data202", "A,B", "95,65"),
+                Student("Gpa", "Two", "gpa2@school.com", "Data200", "A", "92"),
+                Student("Gpa", "Three", "gpa3@school.com", "Data201", "", ""),
+            ])
+            engine = check_my_grade.TranscriptEngine(student_management, self.course_management, self.grade_management)
+            self.assertAlmostEqual(engine.gpa("gpa1@school.com"), (4.0 * 3 + 3.0 * 4) / 7)
+            self.assertEqual(engine.gpa("gpa1@school.com", ["Data200"]), 4.0)
+            self.assertIsNone(engine.gpa("gpa3@school.com"))
+            self.assertEqual(engine.class_rank("gpa1@school.com"), (2, 2))
+            self.assertEqual(engine.deans_list(), [("gpa2@school.com", 4.0)])
+
+            cached = engine.transcript("gpa2@school.com")
+            student_management.add_grade(student_management.get_student("gpa1@school.com"), "Data202", "A", "91")
+            self.assertIs(engine.transcript("gpa2@school.com"), cached)
+            self.assertEqual(engine.gpa("gpa1@school.com"), 4.0)
+            self.assertEqual(engine.class_rank("gpa2@school.com"), (1, 2))
+            self.assertEqual(len(engine.deans_list()), 2)
+
+            # With nothing changed a rank only checks the one student's transcript
+            keys = []
+            cache_key = engine.cache_key
+            engine.cache_key = lambda student: keys.append(student.email_address) or cache_key(student)
+            self.assertEqual(engine.class_rank("gpa1@school.com"), (1, 2))
+            self.assertEqual(keys, ["gpa1@school.com"])
+            student_management.delete_student("gpa2@school.com")
+            self.assertEqual(engine.class_rank("gpa1@school.com"), (1, 1))
+
+    def test_course_cascades(self):
+        """Test course deletes and renames reach students and professors with one save per table."""
+        with self.temp_paths("students_csv", "professors_csv", "courses_csv") as tmp_dir:
+            student_management = StudentManagement()
+            student_management.save_students([
+                Student("Cascade", "One", "cascade1@school.com", "Data200,Data201", "A,B", "95,75"),
+                Student("Cascade", "Two", "cascade2@school.com", "Data201", "B", "72"),
+                Student("Cascade", "Three", "cascade3@school.com", "Data200", "A", "90"),
+            ])
+            professor_management = ProfessorManagement()
+            professor_management.save_professors([Professor("Prof One", "cascade_p1@school.com", "Professor", "Data201,Data230"), Professor("Prof Two", "cascade_p2@school.com", "Professor", "Data200")])
+            course_management = CourseManagement(students=student_management, professors=professor_management)
+            course_management.save_courses([Course("Data200", "3", "Python", "Python"), Course("Data201", "3", "Database", "Database"), Course("Data230", "4", "Visualization", "Visualization")])
+
+            saves = []
+            storage_save = student_management.storage.save
+            student_management.storage.save = lambda table, *args: saves.append(table) or storage_save(table, *args)
+            course_management.delete_course("Data201")
+            self.assertEqual(saves, ["students"])
+            self.assertEqual(StudentManagement().get_student("cascade1@school.com").course_dict(), {"Data200": {"grade": "A", "marks": "95"}})
+            self.assertEqual(StudentManagement().get_student("cascade2@school.com").courses, "")
+            self.assertEqual(ProfessorManagement().get_professor("cascade_p1@school.com").courses, "Data230")
+
+            course_management.rename_course("Data200", "Data300")
+            self.assertEqual(StudentManagement().get_student("cascade3@school.com").course_dict(), {"Data300": {"grade": "A", "marks": "90"}})
+            self.assertEqual(ProfessorManagement().get_professor("cascade_p2@school.com").courses, "Data300")
+            self.assertEqual(list(CourseManagement(students=student_management, professors=professor_management).course_dict), ["Data230", "Data300"])
+            self.assertEqual(set(student_management.course_students("Data300")[1]), {"cascade1@school.com", "cascade3@school.com"})
+            with self.assertRaises(ValueError):
+                course_management.rename_course("Data300", "Data230")
+
+            # Login deletes go to the manager's own users, never to the shared login.csv
+            with open(check_my_grade.users_csv, 'rb') as file:
+                shared_logins = file.read()
+            storage = check_my_grade.SqliteStorage(os.path.join(tmp_dir, "cascade.db"))
+            try:
+                UserManagement(storage=storage).add_user(User("cascade1@school.com", "hash", "student"))
+                sqlite_students = StudentManagement(storage=storage)
+                sqlite_students.add_new_student(Student("Cascade", "One", "cascade1@school.com"))
+                sqlite_students.delete_student("cascade1@school.com")
+                self.assertFalse(UserManagement(storage=storage).check_user("cascade1@school.com"))
+            finally:
+                storage.close()
+            users = UserManagement(storage=check_my_grade.SqliteStorage(os.path.join(tmp_dir, "users.db")))
+            users.add_user(User("cascade_p1@school.com", "hash", "professor"))
+            ProfessorManagement(users=users).delete_professor("cascade_p1@school.com")
+            self.assertFalse(users.check_user("cascade_p1@school.com"))
+            with open(check_my_grade.users_csv, 'rb') as file:
+                self.assertEqual(file.read(), shared_logins)
+
+    def test_sharded_students(self):
+        """Test resharding keeps every student in roster order, also for managers opened before it, and single-student saves rewrite one shard."""
+        with self.temp_paths("students_csv") as tmp_dir:
+            # Not in email order, the roster order must survive the shards
+            StudentManagement().save_students([Student(f"Shard{i}", "Student", f"shard{i}@school.com", "Data200", "A", str(i)) for i in (i * 37 % 200 for i in range(200))])
+            unsharded = StudentManagement()
+            roster = list(unsharded.student_dict)
+            storage = check_my_grade.CsvStorage()
+            self.assertEqual(storage.reshard("students", 4), 200)
+            self.assertFalse(os.path.exists(check_my_grade.students_csv))
+            self.assertEqual(len(os.listdir(tmp_dir)), 6)  # 4 shards, the manifest and the lock file
+            self.assertEqual(list(StudentManagement().student_dict), roster)
+
+            # A manager opened before the reshard finds the manifest and saves into the shards
+            unsharded.add_new_student(Student("Late", "Student", "late@school.com"))
+            self.assertFalse(os.path.exists(check_my_grade.students_csv))
+            self.assertEqual(len(unsharded.students), 201)
+
+            sharded = StudentManagement()
+            self.assertEqual(list(sharded.student_dict), list(unsharded.student_dict))
+            self.assertEqual([s.email_address for s in sharded.get_students("Shard1")], [s.email_address for s in unsharded.get_students("Shard1")])
+
+            shard_paths = [storage.shard_path("students", shard, 4) for shard in range(4)]
+            mtimes = [os.stat(path).st_mtime_ns for path in shard_paths]
+            student = sharded.get_student("shard7@school.com")
+            student.update_first_name("Changed")
+            sharded.update_student(student)
+            changed_shards = [path for path, mtime in zip(shard_paths, mtimes) if os.stat(path).st_mtime_ns != mtime]
+            self.assertEqual(changed_shards, [shard_paths[storage.shard_of("shard7@school.com", 4)]])
+            # Updates move to the end, enrollment changes stay in place
+            sharded.update_course_id("Data200", "Data210")
+            self.assertEqual(list(StudentManagement().student_dict), list(sharded.student_dict))
+
+            # Another process reshards, this manager reloads and keeps saving into the new layout
+            check_my_grade.CsvStorage().reshard("students", 2)
+            sharded.delete_student("shard8@school.com")
+            reloaded = StudentManagement()
+            self.assertEqual(len(reloaded.students), 200)
+            self.assertEqual(list(reloaded.student_dict), list(sharded.student_dict))
+            self.assertEqual(reloaded.get_student("shard7@school.com").first_name, "Changed")
+            self.assertFalse(any(os.path.exists(path) for path in shard_paths))
+
+    def test_batch_reports(self):
+        """Test pooled course and professor reports are identical to the serial ones."""
+        with self.temp_paths("students_csv") as tmp_dir:
+            student_management = StudentManagement()
+            student_management.save_students([Student(f"Report{i}", "Student", f"report{i}@school.com", "Data200,Data201", "A,B", f"{i % 50 + 50},") for i in range(300)])
+            generator = check_my_grade.ReportGenerator(student_management, self.course_management, self.professor_management)
+            progress = []
+            serial = generator.generate(os.path.join(tmp_dir, "serial"), workers=1)
+            pooled = generator.generate(os.path.join(tmp_dir, "pooled"), workers=2, progress=lambda done, total: progress.append((done, total)))
+            courses = len(self.course_management.course_dict)
+            self.assertEqual((serial["courses"], pooled["courses"]), (courses, courses))
+            self.assertEqual(progress[-1], (courses, courses))
+
+            names = sorted(os.listdir(os.path.join(tmp_dir, "serial")))
+            self.assertEqual(names, sorted(os.listdir(os.path.join(tmp_dir, "pooled"))))
+            self.assertEqual(len(names), courses + len(self.professor_management.professor_dict))
+            for name in names:
+                with open(os.path.join(tmp_dir, "serial", name)) as serial_file, open(os.path.join(tmp_dir, "pooled", name)) as pooled_file:
+                    self.assertEqual(serial_file.read(), pooled_file.read())
+            with open(os.path.join(tmp_dir, "serial", "course_Data200.txt")) as file:
+                report = file.read()
+            self.assertIn(str(student_management.course_stats("Data200")), report)
+            self.assertEqual(report.count("report7@school.com"), 4)
+
+    def test_student_query(self):
+        """Test planned queries return what a full scan returns and explain the index used."""
+        with self.temp_paths("students_csv"):
+            student_management = StudentManagement()
+            student_management.save_students([
+                Student(f"First{i}", ["ganna", "smith", "lee"][i % 3], f"query{i}@school.com", ["Data200,Data201", "Data201", "Data202"][i % 3], ["A,B", "A-", "C"][i % 3], f"{i % 100},{(i * 7) % 100}")
+                for i in range(300)
+            ])
+            queries = ["course:Data200 marks>=80 grade:A last_name:ganna", "course:Data201 marks<10", "grade:A- OR email:query5@school.com",
+                       "email:query1* marks=7", "last_name:lee AND course:Data202", "marks>95", "First1 OR First2*", "course:Data20* grade:B"]
+            for query in queries:
+                groups = check_my_grade.parse_student_query(query)
+                expected = sorted(email for email, student in student_management.student_dict.items() if any(check_my_grade.match_student_query(student, group) for group in groups))
+                self.assertEqual([student.email_address for student in student_management.query_students(query)], expected, query)
+
+            # grade and marks bind to the named course
+            self.assertEqual([s.email_address for s in student_management.query_students("course:Data201 grade:A")], [])
+            self.assertIn("sorted marks of Data201", student_management.explain_query("course:Data201 marks<10"))
+            self.assertIn("email hash", student_management.explain_query("email:query5@school.com last_name:smith"))
+            self.assertIn("scan all 300 students", student_management.explain_query("last_name:le*"))
+            with self.assertRaises(ValueError):
+                student_management.query_students("marks>=high")
+
+    def test_binary_snapshot(self):
+        """Test snapshots hold the parsed roster, are written only on save and ignored when stale or corrupt."""
+        with self.temp_paths("students_csv"):
+            writer = StudentManagement(storage=check_my_grade.CsvStorage(snapshots=True))
+            students = [Student(f"Snap{i}", "Student", f"snap{i}@school.com", "Data200,Data300", "A,B", f"{i},8{i}.5") for i in range(100)]
+            writer.save_students(students)
+            snapshot_path = check_my_grade.students_csv + ".snap"
+            self.assertTrue(os.path.exists(snapshot_path))
+
+            storage = check_my_grade.CsvStorage(snapshots=True)
+            self.assertEqual(storage.load_snapshot("students"), [student.state() for student in students])
+            reader = StudentManagement(storage=storage)
+            self.assertEqual([student.to_dict() for student in reader.students], [student.to_dict() for student in StudentManagement().students])
+
+            # Loading never writes a snapshot
+            os.remove(snapshot_path)
+            StudentManagement(storage=check_my_grade.CsvStorage(snapshots=True))
+            self.assertFalse(os.path.exists(snapshot_path))
+            writer.save_students(writer.students)
+
+            # A csv written without snapshots leaves the old snapshot stale
+            StudentManagement().add_new_student(Student("Plain", "Writer", "plain@school.com"))
+            self.assertIsNone(storage.load_snapshot("students"))
+            self.assertIn("plain@school.com", StudentManagement(storage=check_my_grade.CsvStorage(snapshots=True)).student_dict)
+
+            # A flipped payload byte fails the checksum
+            writer.update_student(writer.get_student("snap1@school.com"))
+            self.assertIsNotNone(storage.load_snapshot("students"))
+            with open(snapshot_path, "r+b") as file:
+                file.seek(-1, os.SEEK_END)
+                last = file.read(1)
+                file.seek(-1, os.SEEK_END)
+                file.write(bytes([last[0] ^ 0xFF]))
+            self.assertIsNone(storage.load_snapshot("students"))
+
+    def test_paginated_listing(self):
+        """Test cursor and offset pages follow adds and deletes and render with one write."""
+        with self.temp_paths("students_csv"):
+            student_management = StudentManagement()
+            student_management.save_students([Student("Page", f"Student{i}", f"page{i:02}@school.com", "Data200", "A", "90") for i in range(25)])
+            student_management.list_students()
+            student_management.add_new_student(Student("Page", "Added", "page00a@school.com", "Data200", "A", "90"))
+            student_management.delete_student("page24@school.com")
+
+            emails, cursor = [], None
+            while True:
+                students, cursor = student_management.list_students(page_size=10, after=cursor)
+                emails.extend(student.email_address for student in students)
+                if cursor is None:
+                    break
+            self.assertEqual(emails, sorted(student_management.student_dict))
+            self.assertEqual([student.email_address for student in student_management.list_students(page_size=2, offset=1)[0]], ["page00a@school.com", "page01@school.com"])
+
+            class CountingStream:
+                writes = []
+
+                def write(self, text):
+                    self.writes.append(text)
+
+            stream = CountingStream()
+            check_my_grade.render_table("Students", [student.to_dict() for student in student_management.list_students(page_size=10)[0]], check_my_grade.table_fields["students"], stream)
+            self.assertEqual(len(stream.writes), 1)
+            self.assertEqual(stream.writes[0].count("@school.com"), 10)
+
+    def test_bulk_import(self):
+        """Test streaming student and enrollment records in batches with rejects reported."""
+        with self.temp_paths("students_csv") as tmp_dir:
+            path = os.path.join(tmp_dir, "import.jsonl")
+            records = [
+                {"first_name": "Bulk", "last_name": "One", "email_address": "bulk1@school.com", "courses": "Data200", "grades": "A", "marks": "95"},
+                {"first_name": "Bulk", "last_name": "Two", "email_address": "bulk2@school.com"},
+                {"first_name": "Bulk", "last_name": "Bad", "email_address": "bulk3@school.com", "courses": "Nope100", "grades": "A", "marks": "95"},
+                {"email_address": "bulk2@school.com", "course_id": "Data201", "grade": "B", "marks": "75"},
+                {"email_address": "bulk1@school.com", "course_id": "Data201", "grade": "Z", "marks": "75"},
+                {"email_address": "missing@school.com", "course_id": "Data201", "grade": "B", "marks": "75"},
+                {"email_address": "bulk1@school.com", "course_id": "Data201", "grade": "B", "marks": "7x"},
+            ]
+            with open(path, "w") as file:
+                file.writelines(json.dumps(record) + "\n" for record in records)
+
+            student_management = StudentManagement()
+            report = check_my_grade.BulkImport(student_management, self.course_management, self.grade_management, batch_size=2).import_file(path)
+            self.assertEqual((report["rows"], report["imported"], report["batches"]), (7, 3, 2))
+            self.assertEqual([row_number for row_number, _ in report["rejected"]], [3, 5, 6, 7])
+            self.assertGreater(report["rows_per_second"], 0)
+
+            reloaded = StudentManagement()
+            self.assertEqual(reloaded.get_student("bulk1@school.com").course_dict(), {"Data200": {"grade": "A", "marks": "95"}})
+            self.assertEqual(reloaded.get_student("bulk2@school.com").course_dict(), {"Data201": {"grade": "B", "marks": "75"}})
+            self.assertNotIn("bulk3@school.com", reloaded.student_dict)
+
+    def test_benchmark_report(self):
+        """Test the benchmark suite reports every operation and flags regressions."""
+        report = benchmark_check_my_grade.run([50], 2)
+        operations = {result["operation"] for result in report["results"]}
+        self.assertTrue({"students.add", "students.get_students", "students.course_students", "users.login", "grades.load"} <= operations)
+        self.assertEqual(benchmark_check_my_grade.compare(report, report), [])
+
+        slower = {"results": [dict(result, p50_ms=result["p50_ms"] * 2) for result in report["results"]]}
+        self.assertEqual(len(benchmark_check_my_grade.compare(report, slower)), len([r for r in report["results"] if r["p50_ms"]]))
+
+    def test_metrics(self):
+        """Test instrumented methods record calls, latencies and bytes when enabled."""
+        check_my_grade.metrics.reset()
+        check_my_grade.metrics.enabled = True
+        try:
+            course_management = CourseManagement()
+            course_management.get_course("Data200")
+            course_management.add_new_course(Course("METRICS1", 3, "Metrics", "Metrics course"))
+            course_management.delete_course("METRICS1")
+        finally:
+            check_my_grade.metrics.enabled = False
+        course_management.get_course("Data200")
+
+        snapshot = check_my_grade.metrics.snapshot()
+        self.assertEqual(snapshot["methods"]["CourseManagement.get_course"]["count"], 1)
+        self.assertEqual(snapshot["methods"]["CourseManagement.save_courses"]["count"], 2)
+        self.assertGreater(snapshot["bytes_read"]["courses"], 0)
+        self.assertGreater(snapshot["bytes_written"]["courses"], 0)
+        self.assertIn('check_my_grade_calls_total{method="CourseManagement.add_new_course"} 1', check_my_grade.metrics.to_prometheus())
+        check_my_grade.metrics.reset()
+
+    def test_grade_server(self):
+        """Test concurrent server sessions for login, record view, reports and grade entry, reads not waiting on saves."""
+        professor = User("server_professor@school.com", self.user_management.encrypt_password("password123"), "professor")
+        self.user_management.add_user(professor)
+        self.student_management.add_new_student(Student("Server", "Student", "server_student@school.com", "Data202"))
+
+        async def request(reader, writer, message):
+            writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        async def scenario():
+            grade_server = check_my_grade.GradeServer(self.student_management, self.user_management)
+            server = await grade_server.start(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                self.assertFalse((await request(reader, writer, {"op": "search", "key": "Server"}))["ok"])
+                self.assertTrue((await request(reader, writer, {"op": "login", "user_id": "server_professor@school.com", "password": "password123", "role": "professor"}))["ok"])
+                response = await request(reader, writer, {"op": "add_grade", "email_address": "server_student@school.com", "course_id": "Data202", "grade": "A", "marks": "96"})
+                self.assertTrue(response["ok"])
+                report = (await request(reader, writer, {"op": "course_report", "course_id": "Data202"}))["result"]
+                self.assertEqual(report["students"]["server_student@school.com"]["marks"], "96")
+                search = (await request(reader, writer, {"op": "search", "key": "server_student"}))["result"]
+                self.assertEqual([student["email_address"] for student in search], ["server_student@school.com"])
+                writer.close()
+
+                rps = await check_my_grade.load_test("127.0.0.1", port, "server_professor@school.com", "password123", "professor",
+                                                     clients=5, requests=20, ops=[{"op": "course_report", "course_id": "Data202"}])
+                print(f"Grade server load test: {rps:.1f} requests/s")
+                self.assertEqual(grade_server.requests, 5 + 5 * 21)
+
+                # Reads from other sessions are answered while a grade save is writing
+                saving, release = threading.Event(), threading.Event()
+                storage = self.student_management.storage
+                storage_save = storage.save
+                storage.save = lambda *args: (saving.set(), release.wait(10), storage_save(*args))[-1]
+                loop = asyncio.get_running_loop()
+                grader = await asyncio.open_connection("127.0.0.1", port)
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                try:
+                    for connection in (grader, (reader, writer)):
+                        await request(*connection, {"op": "login", "user_id": "server_professor@school.com", "password": "password123", "role": "professor"})
+                    grading = asyncio.create_task(request(*grader, {"op": "add_grade", "email_address": "server_student@school.com", "course_id": "Data202", "grade": "B", "marks": "85"}))
+                    self.assertTrue(await loop.run_in_executor(None, saving.wait, 10))
+                    student = await asyncio.wait_for(request(reader, writer, {"op": "student", "email_address": "server_student@school.com"}), 5)
+                    self.assertEqual(student["result"]["marks"], "85")
+                    self.assertTrue((await asyncio.wait_for(request(reader, writer, {"op": "search", "key": "server_student"}), 5))["ok"])
+                    self.assertFalse(grading.done())
+                    release.set()
+                    self.assertTrue((await grading)["ok"])
+                finally:
+                    release.set()
+                    del storage.save
+                    grader[1].close()
+                    writer.close()
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            self.student_management.delete_student("server_student@school.com")
+            self.user_management.delete_user("server_professor@school.com")
+
+    def test_concurrent_writers_merge(self):
+        """Test two managers sharing one csv merge their changes instead of clobbering them."""
+        with self.temp_paths("students_csv") as tmp_dir:
+            first = StudentManagement()
+            first.save_students([Student("Shared", "Student", "shared@school.com")])
+            second = StudentManagement()
+
+            first.add_new_student(Student("First", "Writer", "first_writer@school.com"))
+            second.add_new_student(Student("Second", "Writer", "second_writer@school.com"))
+            first.delete_student("shared@school.com")
+
+            emails = {student.email_address for student in StudentManagement().students}
+            self.assertEqual(emails, {"first_writer@school.com", "second_writer@school.com"})
+            self.assertEqual([name for name in os.listdir(tmp_dir) if name.endswith(".tmp")], [])
+
+    def test_reload_only_when_stale(self):
+        """Test saves do not re-parse the csv and reloads happen only after external changes."""
+        with self.temp_paths("courses_csv"):
+            course_management = CourseManagement()
+            loads = []
+            storage_load = course_management.storage.load_rows
+            course_management.storage.load_rows = lambda table: loads.append(table) or storage_load(table)
+
+            course_management.add_new_course(Course("STALE1", 3, "Stale", "Stale course"))
+            course_management.reload_courses()
+            self.assertEqual(loads, [])
+
+            CourseManagement().add_new_course(Course("STALE2", 3, "Stale", "Added elsewhere"))
+            course_management.reload_courses()
+            self.assertEqual(loads, ["courses"])
+            self.assertIn("STALE2", course_management.course_dict)
+
+    def test_write_behind(self):
+        """Test write-behind saves are coalesced into one write per flush."""
+        with self.temp_paths("students_csv"):
+            inner = check_my_grade.CsvStorage()
+            writes = []
+            inner_save = inner.save
+            inner.save = lambda table, rows, changed=None, removed=None: writes.append(table) or inner_save(table, rows, changed, removed)
+            storage = check_my_grade.WriteBehindStorage(inner, interval=60, batch_size=10000)
+            student_management = StudentManagement(storage=storage)
+            for i in range(200):
+                student_management.add_new_student(Student(f"First{i}", f"Last{i}", f"behind{i}@school.com", "Data200"))
+                student_management.add_grade(student_management.get_student(f"behind{i}@school.com"), "Data200", "A", "90")
+            self.assertEqual(writes, [])
+            self.assertEqual(len(student_management.students), 200)
+
+            storage.flush()
+            self.assertEqual(writes, ["students"])
+            self.assertEqual(StudentManagement().get_student("behind199@school.com").marks, "90")
+            storage.close()
+
+            # Commit durability returns only once the change is written
+            storage = check_my_grade.WriteBehindStorage(check_my_grade.CsvStorage(), interval=60, durability="commit")
+            StudentManagement(storage=storage).delete_student("behind0@school.com")
+            self.assertEqual(len(StudentManagement().students), 199)
+            storage.close()
+
+            # A failing flush is raised to the waiting saver instead of blocking it
+            inner = check_my_grade.CsvStorage()
+            inner_save = inner.save
+            failures = [OSError("disk full")]
+
+            def failing_save(*args):
+                if failures:
+                    raise failures[0]
+                return inner_save(*args)
+            inner.save = failing_save
+            storage = check_my_grade.WriteBehindStorage(inner, interval=60, durability="commit")
+            student_management = StudentManagement(storage=storage)
+            with self.assertRaises(OSError):
+                student_management.add_new_student(Student("Full", "Disk", "full@school.com"))
+            failures.clear()
+            student_management.add_new_student(Student("Retried", "Disk", "retried@school.com"))
+            self.assertTrue({"full@school.com", "retried@school.com"} <= set(StudentManagement().student_dict))
+            storage.close()
+
+    def test_read_write_lock(self):
+        """Test readers and a writer can share a manager across threads."""
+        errors = []
+
+        def read():
+            try:
+                for _ in range(20):
+                    self.student_management.get_students("harika")
+                    self.student_management.course_students("Data200")
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for i in range(5):
+            self.student_management.add_new_student(Student("Locked", "Student", f"locked{i}@school.com", "Data200"))
+        for i in range(5):
+            self.student_management.delete_student(f"locked{i}@school.com")
+        for reader in readers:
+            reader.join()
+        self.assertEqual(errors, [])
+
+        lock = check_my_grade.ReadWriteLock()
+        lock.acquire_read()
+        with self.assertRaises(RuntimeError):
+            lock.acquire_write()
+        lock.release_read()
+        lock.acquire_write()
+        lock.acquire_read()
+        lock.release_read()
+        lock.release_write()
+
     def test_add_delete_modify_course(self):
         """Test adding, modifying, and deleting courses."""
         course = Course("DATA101", 3, "Data Analytics", "Intro to DA")